@@ -0,0 +1 @@
+"""Benchmarks of depcy, run from the repository root with python -m benchmarks.<name>"""
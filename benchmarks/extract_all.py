@@ -0,0 +1,66 @@
+"""
+    Time of extract_all, which merges a view of each doc once and walks its tree once, against
+    the chained calls merge_all, nouns_propns, get_SPOs and phrasesToStr.
+
+    The docs are parsed once; the chained calls merge fresh copies of them (extract_all leaves
+    the docs alone), and both ways must give the same nouns, SPOs and strings.
+
+    Run from the repository root (needs en_core_web_sm):
+
+    > python -m benchmarks.extract_all --repeat 50
+"""
+import argparse
+import time
+
+from depcy.base.merge import merge_all
+from depcy.extract import extract_all, get_SPOs, nouns_propns, phrasesToStr
+from depcy.models import get_nlp
+
+TEXTS = [
+    "The blue, red apple of the apple tree has been fallen.",
+    "The soldier and the teacher walk to the pub, which was closed.",
+    "Momentum is conserved in this system because there are no external forces acting on it.",
+    "The system is isolated, and the only forces at play are the internal forces between the two carts during the collision.",
+    "The textile industry was the first to use modern production methods, and textiles became the dominant industry in terms of employment.",
+    "Output greatly increased, and the result was an unprecedented rise in population and the rate of population growth.",
+]
+
+
+def chained(docs):
+    results = []
+    for doc in docs:
+        merged = merge_all(doc.copy())
+        spos = get_SPOs(merged)
+        results.append({"nouns": nouns_propns(merged), "spos": spos, "strings": [phrasesToStr(spo) for spo in spos]})
+    return results
+
+def fused(docs):
+    return [extract_all(doc) for doc in docs]
+
+def texts(result):
+    """The nouns, SPOs and strings of a result as texts, to compare a doc with a view"""
+    spos = [[s.text, p.text, [o.text for o in os]] for s, p, os in result["spos"]]
+    return [token.text for token in result["nouns"]], spos, result["strings"]
+
+def timed(function, docs):
+    start = time.perf_counter()
+    result = function(docs)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20, help="number of times each sentence is parsed")
+    args = parser.parse_args()
+
+    docs = list(get_nlp().pipe(TEXTS * args.repeat))
+    timed(chained, docs[:6]), timed(fused, docs[:6]) # warm up
+    chained_results, t_chained = timed(chained, docs)
+    fused_results, t_fused = timed(fused, docs)
+    same = all(texts(a) == texts(b) for a, b in zip(chained_results, fused_results))
+    print(f"{len(docs)} sentences, same result: {same}")
+    print(f"chained:     {t_chained * 1000:8.1f} ms")
+    print(f"extract_all: {t_fused * 1000:8.1f} ms  ({t_chained / t_fused:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+    Latency and top-1 agreement of the fill-mask backends in depcy.fill_mask.
+
+    The masked prompts come from the doctest sentences of depcy.split. Every
+    backend fills the same prompts; agreement is measured against the default
+    full precision pipeline.
+
+    Run from the repository root (needs en_core_web_sm and depcy[fill-mask]):
+
+    > python -m benchmarks.fill_mask --quantized models/distilroberta-base
+    > python -m benchmarks.fill_mask --onnx models/distilroberta-onnx --onnx-file model_int8.onnx
+"""
+import argparse
+import time
+
+from depcy.fill_mask import FILL_MASK_MODEL, PipelineMaskFiller, QuantizedMaskFiller, OnnxMaskFiller
+from depcy.models import get_nlp
+from depcy.split import subtreePhrases
+
+SENTENCES = [
+    "Tom plays tennis and Jo plays socker",
+    "The soldier and the teacher walk home and take supper and drink wine.",
+    "The soldier and the teacher walk to the pub, which was closed.",
+]
+
+
+def prompts(sentences, repeat):
+    """Returns the fill-mask prompts of sentences, as fillPhrases builds them"""
+    result = []
+    for doc in get_nlp().pipe(sentences):
+        phrases = subtreePhrases(doc)
+        result.extend(f"{phrases[0]} and {phrase}" for phrase in phrases if "<mask>" in phrase)
+    return result * repeat
+
+def timed(filler, prompts, batch_size):
+    filler(prompts[:1]) # warm up
+    start = time.perf_counter()
+    sequences = filler(prompts, batch_size=batch_size)
+    return sequences, (time.perf_counter() - start) * 1000 / len(prompts)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=FILL_MASK_MODEL, help="baseline pipeline model")
+    parser.add_argument("--quantized", help="local model path for the torch int8 backend")
+    parser.add_argument("--onnx", help="local ONNX export path for the onnxruntime backend")
+    parser.add_argument("--onnx-file", default="model.onnx")
+    parser.add_argument("--repeat", type=int, default=20, help="repeat the prompts to get stable timings")
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    ps = prompts(SENTENCES, args.repeat)
+    if not ps:
+        raise SystemExit("no <mask> prompts in the sentences")
+    backends = {"pipeline": lambda: PipelineMaskFiller(args.model)}
+    if args.quantized:
+        backends["torch-int8"] = lambda: QuantizedMaskFiller(args.quantized)
+    if args.onnx:
+        backends["onnx"] = lambda: OnnxMaskFiller(args.onnx, file=args.onnx_file)
+
+    baseline = None
+    print(f"{len(ps)} prompts, batch size {args.batch_size}")
+    print(f"{'backend':12} {'ms/prompt':>10} {'top-1 agreement':>16}")
+    for name, build in backends.items():
+        sequences, ms = timed(build(), ps, args.batch_size)
+        baseline = baseline or sequences
+        agreement = sum(a == b for a, b in zip(sequences, baseline)) / len(ps)
+        print(f"{name:12} {ms:10.2f} {agreement:16.1%}")
+
+
+if __name__ == "__main__":
+    main()
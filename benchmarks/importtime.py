@@ -0,0 +1,75 @@
+"""
+    Import-time budget check for depcy.
+
+    Runs `python -X importtime -c "import <module>"` in a fresh interpreter and
+    fails if the cumulative import time exceeds the budget, or if a heavy
+    optional dependency (transformers, torch) is imported at all.
+
+    Run from the repository root:
+
+    > python -m benchmarks.importtime
+    > python -m benchmarks.importtime depcy.extract --budget-ms 1500
+"""
+import argparse
+import re
+import subprocess
+import sys
+
+# module -> cumulative import budget in milliseconds (spacy itself is most of it)
+BUDGETS = {
+    "depcy.extract": 2000,
+    "depcy.base.merge": 2000,
+    "depcy.split": 2000,
+    "depcy.utils": 2000,
+}
+FORBIDDEN = ("transformers", "torch", "pyarrow")
+
+LINE = re.compile(r"import time:\s+(?P<self>\d+)\s+\|\s+(?P<cumulative>\d+)\s+\|(?P<indent>\s*)(?P<module>\S+)")
+
+
+def importtime(module):
+    """Returns {imported module: cumulative microseconds} for a fresh `import module`"""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True, check=True)
+    times = {}
+    for line in proc.stderr.splitlines():
+        m = LINE.match(line)
+        if m:
+            times[m.group("module")] = int(m.group("cumulative"))
+    return times
+
+def loaded(module):
+    """Returns the top-level packages in sys.modules after a fresh `import module`"""
+    code = f"import sys, {module}; print(' '.join(sorted({{m.split('.')[0] for m in sys.modules}})))"
+    proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return set(proc.stdout.split())
+
+def check(module, budget_ms):
+    """Prints the import time of module and returns a list of budget violations"""
+    times = importtime(module)
+    total_ms = times.get(module, 0) / 1000
+    # -X importtime also lists failed probes (thinc tries torch), so check what actually got loaded
+    heavy = sorted(loaded(module) & set(FORBIDDEN))
+    print(f"{module:20} {total_ms:8.1f} ms (budget {budget_ms} ms)")
+    errors = []
+    if total_ms > budget_ms:
+        errors.append(f"{module}: {total_ms:.1f} ms > {budget_ms} ms")
+    if heavy:
+        errors.append(f"{module}: imports {', '.join(heavy[:5])}")
+    return errors
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=list(BUDGETS))
+    parser.add_argument("--budget-ms", type=float, default=None, help="override the per-module budget")
+    args = parser.parse_args()
+    errors = []
+    for module in args.modules:
+        errors.extend(check(module, args.budget_ms or BUDGETS.get(module, 2000)))
+    for error in errors:
+        print("FAIL", error)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
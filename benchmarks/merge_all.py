@@ -0,0 +1,57 @@
+"""
+    Time of merge_all: planned on an overlay and retokenized once, against the
+    sequential merges that retokenize the doc once per merge function.
+
+    The docs are parsed once; every run merges fresh copies of them and checks that
+    both ways give the same tokens, heads and deps.
+
+    Run from the repository root (needs en_core_web_sm):
+
+    > python -m benchmarks.merge_all --repeat 50
+"""
+import argparse
+import time
+
+from depcy.base.merge import merge_all
+from depcy.models import get_nlp
+
+TEXTS = [
+    "The blue, red apple of the apple tree has been fallen.",
+    "The soldier and the teacher walk to the pub, which was closed.",
+    "Tom plays tennis and Jo plays socker.",
+    "Alice, the sister of Bob, reads a book about the history of the Roman empire.",
+    "The new manager of the local football club, a former player, signed three young strikers and a goalkeeper.",
+    "During the long winter the small village near the old castle was cut off from the rest of the country.",
+]
+
+
+def signature(doc):
+    return [(token.text, token.head.i, token.dep_) for token in doc]
+
+def timed(docs, planned, flags):
+    copies = [doc.copy() for doc in docs]
+    start = time.perf_counter()
+    merged = [merge_all(doc, planned=planned, **flags) for doc in copies]
+    return merged, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20, help="number of docs, each the texts joined")
+    parser.add_argument("--punct", action="store_true", help="merge punctuation as well")
+    parser.add_argument("--conj", action="store_true", help="merge noun conjunctions as well")
+    args = parser.parse_args()
+
+    flags = {"punct": args.punct, "conj": args.conj}
+    docs = list(get_nlp().pipe([" ".join(TEXTS)] * args.repeat))
+    tokens = sum(len(doc) for doc in docs)
+    timed(docs[:1], False, flags), timed(docs[:1], True, flags) # warm up
+    sequential, t_sequential = timed(docs, False, flags)
+    planned, t_planned = timed(docs, True, flags)
+    same = all(signature(a) == signature(b) for a, b in zip(sequential, planned))
+    print(f"{len(docs)} docs, {tokens} tokens, same result: {same}")
+    print(f"sequential: {t_sequential * 1000:8.1f} ms")
+    print(f"planned:    {t_planned * 1000:8.1f} ms  ({t_sequential / t_planned:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
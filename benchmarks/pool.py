@@ -0,0 +1,58 @@
+"""
+    Throughput of depcy.pool.ExtractPool against the number of worker processes and the chunk size,
+    relative to pipeline.stream in this one process.
+
+    Each pool is started (and its workers load the model) before the clock runs. All ways must
+    give the same results; the speedup is bounded by the cores of the machine (os.cpu_count()).
+
+    Run from the repository root (needs en_core_web_sm):
+
+    > python -m benchmarks.pool --repeat 200 --processes 1 2 4 8 --chunk-size 16 64 256
+"""
+import argparse
+import os
+import time
+
+from depcy.models import DEFAULT_MODEL, get_nlp
+from depcy.pipeline import stream
+from depcy.pool import ExtractPool
+
+TEXTS = [
+    "The blue, red apple of the apple tree has been fallen. The soldier and the teacher walk to the pub, which was closed.",
+    "Momentum is conserved in this system because there are no external forces acting on it.",
+    "The system is isolated, and the only forces at play are the internal forces between the two carts during the collision.",
+    "The textile industry was the first to use modern production methods, and textiles became the dominant industry in terms of employment.",
+    "Output greatly increased, and the result was an unprecedented rise in population and the rate of population growth.",
+    "Alice, the sister of Bob, reads a book about the history of the Roman empire. She likes it.",
+]
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=100, help="number of times each text is parsed")
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4], help="numbers of worker processes")
+    parser.add_argument("--chunk-size", type=int, nargs="+", default=[16, 64], help="numbers of texts per chunk")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    args = parser.parse_args()
+
+    texts = TEXTS * args.repeat
+    list(stream(TEXTS, nlp=get_nlp(args.model))) # warm up
+    expected, t_stream = timed(lambda: list(stream(texts, nlp=get_nlp(args.model))))
+    print(f"{len(texts)} texts, {os.cpu_count()} cpus")
+    print(f"stream:                    {t_stream:7.2f} s  {len(texts) / t_stream:8.1f} texts/s")
+    for processes in args.processes:
+        for chunk_size in args.chunk_size:
+            with ExtractPool(processes=processes, model=args.model, chunk_size=chunk_size) as pool:
+                list(pool.map(TEXTS * processes, chunk_size=1)) # start the workers, load their models
+                results, t_pool = timed(lambda: list(pool.map(texts)))
+            print(f"{processes:2d} processes, chunks of {chunk_size:4d}: {t_pool:7.2f} s  {len(texts) / t_pool:8.1f} texts/s"
+                  f"  ({t_stream / t_pool:.2f}x, same result: {results == expected})")
+
+
+if __name__ == "__main__":
+    main()
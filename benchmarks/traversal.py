@@ -0,0 +1,96 @@
+"""
+    Time of the subtree traversals of depcy.base.navigate and depcy.base.string on deep
+    synthetic trees, against the recursive traversals they replaced.
+
+    A tree of depth D is a chain of D heads, each with a leaf (alternating amod and punct).
+    Both ways must give the same tokens; the recursive one needs a raised recursion limit
+    on deep trees. No model is needed.
+
+    Run from the repository root:
+
+    > python -m benchmarks.traversal --depth 500 2000
+"""
+import argparse
+import sys
+import time
+
+import spacy
+from spacy.tokens import Doc
+
+from depcy.base.index import tree_index
+from depcy.base.navigate import descendants, descendants_and_self
+from depcy.base.string import toStrSub
+
+
+def deep_doc(vocab, depth):
+    """A chain of depth heads: the head of token 2k is token 2k - 2, token 2k + 1 is a leaf of token 2k"""
+    words, heads, deps = [], [], []
+    for k in range(depth):
+        words += [f"w{k}", f"l{k}"]
+        heads += [2 * k - 2 if k else 0, 2 * k]
+        deps += ["nmod" if k else "ROOT", "amod" if k % 2 else "punct"]
+    return Doc(vocab, words=words, heads=heads, deps=deps)
+
+def recursive_descendants(token, skip=[]):
+    """The recursive depcy.base.navigate.descendants, sorting at every level"""
+    descs = []
+    for child in token.children:
+        if child.dep_ not in skip:
+            descs.append(child)
+            descs.extend(recursive_descendants(child, skip=skip))
+    return sorted(descs, key=lambda x: x.i)
+
+def recursive_toStrSub(token, avoid=[]):
+    """The recursive depcy.base.string.toStrSub"""
+    def collect(token):
+        descs = []
+        for child in token.children:
+            if child.dep_ not in avoid:
+                descs.append(child)
+                descs.extend(collect(child))
+        return descs
+    return " ".join(t.text for t in sorted(collect(token), key=lambda x: x.i))
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+def run(vocab, depth, starts, skip):
+    doc = deep_doc(vocab, depth)
+    tokens = [doc[i] for i in range(0, len(doc), max(1, len(doc) // starts))]
+    _, t_index = timed(tree_index, doc)
+
+    def new():
+        return [([t.i for t in descendants(token, skip=skip)], [t.i for t in descendants_and_self(token)],
+                 toStrSub(token, avoid=skip)) for token in tokens]
+
+    def old():
+        return [([t.i for t in recursive_descendants(token, skip=skip)],
+                 sorted([t.i for t in recursive_descendants(token)] + [token.i]),
+                 recursive_toStrSub(token, avoid=skip)) for token in tokens]
+
+    new_result, t_new = timed(new)
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(limit, 4 * depth + 100))
+    try:
+        old_result, t_old = timed(old)
+    finally:
+        sys.setrecursionlimit(limit)
+    print(f"depth {depth:5d}, {len(doc)} tokens, {len(tokens)} subtrees, same result: {old_result == new_result}")
+    print(f"  recursive: {t_old * 1000:8.1f} ms")
+    print(f"  index:     {t_new * 1000:8.1f} ms  ({t_old / t_new:.1f}x, index built in {t_index * 1000:.1f} ms)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--depth", type=int, nargs="+", default=[500, 1000], help="depths of the trees")
+    parser.add_argument("--starts", type=int, default=20, help="number of subtrees traversed per tree")
+    args = parser.parse_args()
+
+    vocab = spacy.blank("en").vocab
+    for depth in args.depth:
+        run(vocab, depth, args.starts, ["punct"])
+
+
+if __name__ == "__main__":
+    main()
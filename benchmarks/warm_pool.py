@@ -0,0 +1,57 @@
+"""
+    Memory and start time of depcy.pool.ExtractPool workers that load their own model (spawned)
+    against warm workers forked from a parent that preloaded the model (preload=True).
+
+    The unique RSS of a worker (its private pages) is the memory it costs on its own; the rest of
+    its RSS is shared. Both pools run the same texts, so the workers have touched what extraction
+    touches, and must give the same results. Needs /proc (Linux).
+
+    Run from the repository root (needs en_core_web_sm):
+
+    > python -m benchmarks.warm_pool --processes 8
+"""
+import argparse
+import time
+
+from depcy.models import DEFAULT_MODEL
+from depcy.pool import ExtractPool
+
+TEXTS = [
+    "The soldier and the teacher walk to the pub, which was closed.",
+    "Momentum is conserved in this system because there are no external forces acting on it.",
+    "Alice, the sister of Bob, reads a book about the history of the Roman empire. She likes it.",
+]
+
+MB = 2 ** 20
+
+
+def run(name, texts, **options):
+    start = time.perf_counter()
+    with ExtractPool(**options) as pool:
+        list(pool.map(texts[:len(texts) // 10 or 1], chunk_size=1)) # start the workers
+        t_start = time.perf_counter() - start
+        results = list(pool.map(texts))
+        memory = pool.worker_memory()
+    uss = [m[1] for m in memory.values() if m is not None]
+    print(f"{name}: {len(memory)} workers started in {t_start:.2f} s")
+    for pid, m in sorted(memory.items()):
+        print(f"  worker {pid}: " + (f"rss {m[0] / MB:7.1f} MB, unique {m[1] / MB:7.1f} MB" if m else "no /proc"))
+    if uss:
+        print(f"  unique RSS of all workers: {sum(uss) / MB:.1f} MB")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=4, help="number of worker processes")
+    parser.add_argument("--repeat", type=int, default=100, help="number of times each text is parsed")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    args = parser.parse_args()
+
+    texts = TEXTS * args.repeat
+    cold = run("own model", texts, processes=args.processes, model=args.model, mp_context="spawn")
+    warm = run("preloaded", texts, processes=args.processes, model=args.model, preload=True)
+    print(f"same result: {cold == warm}")
+
+
+if __name__ == "__main__":
+    main()
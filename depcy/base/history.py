@@ -0,0 +1,127 @@
+# Copyright (C) 2023, 2024 Dr. Wolfgang Spahn
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+    This module records the merges of depcy.base.merge, to undo them without parsing again.
+
+    The first merge of a doc stores its original token arrays (track); every merge function then
+    records its step once the retokenizer applied it: its name and the (start, end) token spans
+    it merged, with their attrs.
+    The history lives in doc.user_data, so it is copied and serialized with the doc.
+    rollback_to(doc, step) rebuilds the doc after `step` merge steps from the original arrays,
+    unmerge(doc) gives back the original tokens.
+
+    In python console use it like this:
+    >>> import spacy
+    >>> nlp = spacy.load("en_core_web_sm")
+    >>> from depcy.base.merge import merge_compound_nouns, merge_phrases
+
+    >>> doc = merge_phrases(merge_compound_nouns(nlp("The blue, red apple of the apple tree has been fallen.")))
+    >>> [token.text for token in doc]
+    ['The blue, red apple', 'of', 'the apple tree', 'has', 'been', 'fallen', '.']
+    >>> steps(doc)
+    ['merge_compound_nouns', 'merge_phrases']
+    >>> [token.text for token in rollback_to(doc, 1)]
+    ['The', 'blue', ',', 'red', 'apple', 'of', 'the', 'apple tree', 'has', 'been', 'fallen', '.']
+    >>> len(unmerge(doc))
+    13
+"""
+import logging
+
+import numpy
+from spacy.attrs import ORTH, SPACY, TAG, POS, MORPH, LEMMA, ENT_IOB, ENT_TYPE, HEAD, DEP, SENT_START
+from spacy.tokens import Doc
+
+logger = logging.getLogger(__name__)
+
+HISTORY = "depcy.merges"
+
+# the token attributes restored by rollback_to, besides HEAD and DEP (or SENT_START)
+ATTRS = [ORTH, SPACY, TAG, POS, MORPH, LEMMA, ENT_IOB, ENT_TYPE]
+
+
+def track(doc):
+    """Starts the history of doc with its original token arrays, before its first merge is retokenized"""
+    if not isinstance(doc, Doc) or HISTORY in doc.user_data:
+        return
+    parsed = doc.has_annotation("DEP")
+    attr_ids = ATTRS + ([HEAD, DEP] if parsed else [SENT_START])
+    doc.user_data[HISTORY] = {"parsed": parsed, "original": doc.to_array(attr_ids), "steps": []}
+
+def record(doc, name, spans, attrs=None, heads=None):
+    """
+        Records a merge step of doc, once it is retokenized (a failed merge is not recorded): the
+        (start, end) spans before merging, their attrs (a list of dicts, or None) and the heads set
+        after merging (or None, if the retokenizer's). track(doc) must have been called before merging.
+    """
+    if not isinstance(doc, Doc):
+        return
+    doc.user_data[HISTORY]["steps"].append({"name": name, "spans": [[start, end] for start, end in spans],
+                                            "attrs": attrs, "heads": heads})
+
+def generation(doc):
+    """The number of merge steps recorded for doc, which changes with every merge of depcy"""
+    history = doc.user_data.get(HISTORY)
+    return len(history["steps"]) if history else 0
+
+def steps(doc):
+    """The names of the merge steps recorded for doc"""
+    history = doc.user_data.get(HISTORY)
+    return [step["name"] for step in history["steps"]] if history else []
+
+def rollback_to(doc, step):
+    """
+        A new doc as doc was after its first `step` merge steps (0: the original tokens),
+        rebuilt from the recorded original arrays and merges, without parsing
+    """
+    history = doc.user_data.get(HISTORY)
+    if not history:
+        return doc.copy()
+    if not 0 <= step <= len(history["steps"]):
+        raise IndexError(f"rollback_to: step {step} of {len(history['steps'])} merge steps")
+    parsed = history["parsed"]
+    attr_ids = ATTRS + ([HEAD, DEP] if parsed else [SENT_START])
+    array = history["original"]
+    strings = doc.vocab.strings
+    words = [strings[orth] for orth in array[:, 0].tolist()]
+    new_doc = Doc(doc.vocab, words=words, spaces=array[:, 1].astype(bool).tolist())
+    new_doc.from_array(attr_ids[2:], array[:, 2:])
+    # extension attributes are keyed by character offset, which merging keeps
+    new_doc.user_data.update((key, value) for key, value in doc.user_data.items() if key != HISTORY)
+    for replayed in history["steps"][:step]:
+        _replay(new_doc, replayed)
+    new_doc.user_data[HISTORY] = {"parsed": parsed, "original": array, "steps": history["steps"][:step]}
+    return new_doc
+
+def unmerge(doc):
+    """A new doc with the original tokens of doc, before any recorded merge"""
+    return rollback_to(doc, 0)
+
+def _replay(doc, step):
+    attrs = step["attrs"] or [None] * len(step["spans"])
+    with doc.retokenize() as retokenizer:
+        for (start, end), span_attrs in zip(step["spans"], attrs):
+            if span_attrs:
+                retokenizer.merge(doc[start:end], attrs=span_attrs)
+            else:
+                retokenizer.merge(doc[start:end])
+    if step["heads"] is not None:
+        array = doc.to_array([HEAD, DEP])
+        array[:, 0] = (numpy.array(step["heads"], dtype="int64") - numpy.arange(len(doc))).astype(array.dtype)
+        doc.from_array([HEAD, DEP], array)
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
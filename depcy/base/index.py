@@ -0,0 +1,271 @@
+# Copyright (C) 2023, 2024 Dr. Wolfgang Spahn
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+    This module contains a tree index of a spacy doc, the base of depcy.base.navigate.
+
+    The index is built once per doc from doc.to_array([HEAD, DEP]): the parent and depth
+    of each token, its sorted children (as spacy's token.children) and the in/out times of
+    an Euler tour over them. A subtree is then a slice of the tour, and ancestor checks
+    are two comparisons. tree_index(doc) keeps the index until the doc is retokenized (see doc_key).
+    Heads set outside depcy (token.head = ..., doc.from_array) are not seen: call invalidate(doc) after them.
+
+    In python console use it like this:
+    >>> import spacy
+    >>> nlp = spacy.load("en_core_web_sm")
+
+    >>> doc = nlp("The blue apple of the tree has fallen.")
+    >>> index = tree_index(doc)
+    >>> tree_index(doc) is index  # built once
+    True
+    >>> index.parent[2], index.depth[2], index.children[2]
+    (7, 1, [0, 1, 3])
+    >>> index.descendants(2)
+    [0, 1, 3, 4, 5]
+    >>> index.descendants(2, skip={"prep"})
+    [0, 1]
+    >>> index.is_ancestor(2, 5), index.is_ancestor(5, 2)
+    (True, False)
+
+    A head set by hand, then seen after invalidate:
+    >>> doc[1].head = doc[0]
+    >>> invalidate(doc)
+    >>> tree_index(doc).parent[1]
+    0
+"""
+import logging
+import weakref
+
+import numpy
+from spacy.attrs import HEAD, DEP
+from spacy.tokens import Doc
+
+from depcy.base.history import generation
+
+logger = logging.getLogger(__name__)
+
+# the count of invalidate calls, in doc.user_data
+EDITS = "depcy.edits"
+
+
+class TreeIndex:
+    """Parent, depth, children and Euler tour of a dependency tree, by token index"""
+
+    def __init__(self, heads, deps, edges=None):
+        n = len(heads)
+        self.parent = heads
+        self.deps = deps
+        self.left, self.right = edges if edges is not None else subtree_edges(heads)
+        # the children spacy finds: the dependents within the edges of their head
+        left, right = self.left, self.right
+        self.children = [[] for _ in range(n)]
+        for i, h in enumerate(heads):
+            if h != i and left[h] <= i <= right[h]:
+                self.children[h].append(i)
+        # Euler tour in preorder: the subtree of i is order[tin[i]:tout[i] + 1]
+        self.order, self.tin, self.tout = [], [0] * n, [0] * n
+        is_child = [False] * n
+        for kids in self.children:
+            for c in kids:
+                is_child[c] = True
+        for top in range(n):
+            if not is_child[top]:
+                self._tour(top)
+        # the first and last token of each subtree, bottom up
+        self.first, self.last = list(range(n)), list(range(n))
+        for i in reversed(self.order):
+            if is_child[i]:
+                h = heads[i]
+                if self.first[i] < self.first[h]: self.first[h] = self.first[i]
+                if self.last[i] > self.last[h]: self.last[h] = self.last[i]
+        self.depth = self._depths()
+
+    def _tour(self, top):
+        order, tin, tout, children = self.order, self.tin, self.tout, self.children
+        stack = [(top, 0)]
+        tin[top] = len(order)
+        order.append(top)
+        while stack:
+            i, k = stack[-1]
+            kids = children[i]
+            if k < len(kids):
+                stack[-1] = (i, k + 1)
+                c = kids[k]
+                tin[c] = len(order)
+                order.append(c)
+                stack.append((c, 0))
+            else:
+                tout[i] = len(order) - 1
+                stack.pop()
+
+    def _depths(self):
+        """The number of heads up to the root of each token"""
+        parent = self.parent
+        depth = [-1] * len(parent)
+        for i in range(len(parent)):
+            path = []
+            while depth[i] < 0 and parent[i] != i and len(path) < len(parent):
+                path.append(i)
+                i = parent[i]
+            d = depth[i] if depth[i] >= 0 else 0
+            depth[i] = d
+            for j in reversed(path):
+                d += 1
+                depth[j] = d
+        return depth
+
+    def __len__(self):
+        return len(self.parent)
+
+    def is_contiguous(self, i):
+        """Whether the subtree of i is the tokens first[i]..last[i]"""
+        return self.tout[i] - self.tin[i] == self.last[i] - self.first[i]
+
+    def is_ancestor(self, i, j):
+        """Whether token j is in the subtree of token i (and not i itself)"""
+        return self.tin[i] < self.tin[j] <= self.tout[i]
+
+    def root(self, i):
+        """The first token up from i with dep ROOT"""
+        parent, deps = self.parent, self.deps
+        while deps[i] != "ROOT" and parent[i] != i:
+            i = parent[i]
+        return i
+
+    def ancestors(self, i):
+        """The heads of i up to the first token with dep ROOT, from the parent up"""
+        parent, deps = self.parent, self.deps
+        ancs = []
+        while deps[i] != "ROOT" and parent[i] != i:
+            i = parent[i]
+            ancs.append(i)
+        return ancs
+
+    def childs(self, i, skip=None):
+        """The children of i, without those with a dep in skip"""
+        if not skip:
+            return list(self.children[i])
+        deps = self.deps
+        return [c for c in self.children[i] if deps[c] not in skip]
+
+    def descendants(self, i, skip=None):
+        """The descendants of i in sentence order, without the subtrees of deps in skip"""
+        tin, tout = self.tin[i], self.tout[i]
+        subtree = self.walk(i, skip=skip) if skip else None
+        if subtree is None or len(subtree) == tout - tin + 1:
+            if self.is_contiguous(i):
+                # nothing skipped of a contiguous subtree: no need to sort
+                first, last = self.first[i], self.last[i]
+                return [j for j in range(first, last + 1) if j != i]
+            return sorted(self.order[tin + 1:tout + 1])
+        return sorted(subtree[1:])
+
+    def walk(self, i, stop=None, skip=None):
+        """
+            The subtree of i in preorder, without the subtree of stop and those of deps in skip.
+            An iterative traversal: a skipped subtree is jumped over in the tour, not visited.
+        """
+        if i == stop:
+            return []
+        order, deps, out = self.order, self.deps, self.tout
+        result = [i]
+        p, end = self.tin[i] + 1, out[i] + 1
+        while p < end:
+            j = order[p]
+            if j == stop or (skip and deps[j] in skip):
+                p = out[j] + 1
+            else:
+                result.append(j)
+                p += 1
+        return result
+
+
+_indexes = weakref.WeakKeyDictionary()
+
+
+def tree_index(doc):
+    """The tree index of doc (a spacy Doc or a depcy Overlay), built once and kept until doc changes"""
+    if not isinstance(doc, Doc):
+        # an overlay resets its index when it merges
+        if doc._index is None:
+            if doc._edges is None:
+                doc._edges = subtree_edges(doc.heads)
+            doc._index = TreeIndex(doc.heads, doc.deps, doc._edges)
+        return doc._index
+    key = doc_key(doc)
+    cached = _indexes.get(doc)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    array = doc.to_array([HEAD, DEP])
+    n = len(doc)
+    heads = (array[:, 0].astype("int64") + numpy.arange(n)).tolist()
+    strings = doc.vocab.strings
+    hashes, inverse = numpy.unique(array[:, 1], return_inverse=True)
+    names = [strings[h] for h in hashes.tolist()]
+    index = TreeIndex(heads, [names[k] for k in inverse.tolist()])
+    _indexes[doc] = (key, index)
+    return index
+
+def doc_key(doc):
+    """
+        A fingerprint of the tree of a spacy doc, taken in constant time: its length, its merges
+        recorded by depcy, its invalidate calls and the heads and deps of its first and last tokens.
+        It changes when the doc is retokenized; heads set by hand elsewhere are not seen.
+    """
+    n = len(doc)
+    if not n:
+        return (0,)
+    first, last = doc[0], doc[n - 1]
+    return n, generation(doc), doc.user_data.get(EDITS, 0), first.head.i, first.dep, last.head.i, last.dep
+
+def invalidate(doc):
+    """Drops the tree index and the token arrays kept for doc, after its heads or deps were set outside depcy"""
+    doc.user_data[EDITS] = doc.user_data.get(EDITS, 0) + 1
+    _indexes.pop(doc, None)
+
+
+def subtree_edges(heads):
+    """Left and right subtree edges, computed like spacy's set_children_from_heads"""
+    n = len(heads)
+    left, right = list(range(n)), list(range(n))
+    # up to 12 sweeps for non-projective parses, until all heads are within their sentences
+    for _ in range(12):
+        for i in range(n):
+            h = heads[i]
+            if left[i] < left[h]: left[h] = left[i]
+            if right[i] > right[h]: right[h] = right[i]
+        for i in range(n - 1, -1, -1):
+            h = heads[i]
+            if right[i] > right[h]: right[h] = right[i]
+            if left[i] < left[h]: left[h] = left[i]
+        if _heads_within_sents(heads, left):
+            break
+    return left, right
+
+def _heads_within_sents(heads, left):
+    n = len(heads)
+    sent_starts = {left[i] for i in range(n) if heads[i] == i}
+    start = 0
+    for i in range(n):
+        if (i > 0 and i in sent_starts) or i == n - 1:
+            for j in range(start, i):
+                if heads[j] < start or heads[j] >= i + 1:
+                    return False
+            start = i
+    return True
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,79 @@
+# Copyright (C) 2023, 2024 Dr. Wolfgang Spahn
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+    This module keeps one registry of compiled matchers for the merges of depcy.
+
+    A matcher holds exactly one named pattern (see PATTERNS). It is built on first use
+    per vocab and then shared, so its patterns are compiled once and never grow,
+    however many documents are matched.
+
+    In python console use it like this:
+    >>> import spacy
+    >>> nlp = spacy.blank("en")
+    >>> matcher = get_matcher(nlp.vocab, "DATE")
+    >>> get_matcher(nlp.vocab, "DATE") is matcher  # shared afterwards
+    True
+    >>> len(matcher)
+    1
+    >>> doc = nlp("Born 24 12 1999 in Bern")
+    >>> [doc[start:end].text for _, start, end in matcher(doc)]
+    ['24 12 1999']
+    >>> clear_matchers()
+"""
+import logging
+import threading
+
+from spacy.matcher import Matcher
+
+logger = logging.getLogger(__name__)
+
+PATTERNS = {
+    # a compound followed by a token that is neither punct nor compound
+    "COMPOUND_NOUN": [[{'DEP': 'compound'}, {'DEP': {'NOT_IN': ['punct', 'compound']}}]],
+    # dd dd dddd
+    "DATE": [[{"ORTH": {"REGEX": r"\d\d"}}, {"ORTH": {"REGEX": r"\d\d"}}, {"ORTH": {"REGEX": r"\d\d\d\d"}}]],
+}
+
+_matchers = {}
+_lock = threading.Lock()
+
+
+def get_matcher(vocab, name):
+    """Returns the shared matcher of vocab for the pattern `name`, compiling it on first use"""
+    # keyed by id, the entry keeps the vocab alive so the id stays its own
+    key = (id(vocab), name)
+    entry = _matchers.get(key)
+    if entry is None:
+        with _lock:
+            entry = _matchers.get(key)
+            if entry is None:
+                logger.debug(f"get_matcher: compiling {name}")
+                if name not in PATTERNS:
+                    raise KeyError(f"unknown matcher pattern {name!r}")
+                matcher = Matcher(vocab)
+                matcher.add(name, PATTERNS[name])
+                entry = (vocab, matcher)
+                _matchers[key] = entry
+    return entry[1]
+
+def clear_matchers():
+    """Drops all compiled matchers"""
+    with _lock:
+        _matchers.clear()
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
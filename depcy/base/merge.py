@@ -196,20 +196,33 @@
     >>> doc = merge_all(doc)
     >>> pprint(nouns_propns(doc))
 
+    Marked math is protected before parsing, so the text is parsed once:
+    >>> doc = parse_math("Let ¦x^2 + 1¦ be larger than ¦y¦.", nlp)
+    >>> [(token.text, token._.math) for token in doc if token._.is_math]
+    [('MATH', 'x^2 + 1'), ('MATH', 'y')]
+
+    A doc parsed with its marks is merged in place:
+    >>> doc = merge_math(None, nlp("Let ¦x^2 + 1¦ be larger than ¦y¦."))
+    >>> [(token.text, token.pos_, token._.math) for token in doc if token._.is_math]
+    [('¦x^2 + 1¦', 'PROPN', 'x^2 + 1'), ('¦y¦', 'PROPN', 'y')]
+
 """
 import logging
+import re
 
 import spacy
-from spacy.matcher import Matcher
 from spacy.util import filter_spans
 from spacy.tokens import Span, Doc, Token
 
+from depcy.base.history import record, track
+from depcy.base.matchers import get_matcher, PATTERNS
 from depcy.base.navigate import descendants
+from depcy.base.overlay import Overlay
+from depcy.base.plan import plan_all, plan_compound
+from depcy.models import resolve_nlp
 
 logger = logging.getLogger(__name__)
 
-nlp = spacy.load("en_core_web_sm")
-
 # You have to set both, Span and Token: TODO: why?
 Token.set_extension("is_math", default=False,force=True)
 Span.set_extension("is_math", default=False,force=True)
@@ -218,12 +231,19 @@ Span.set_extension("math", default="",force=True)
 
 Token.set_extension('ref', default=False, force=True)
 
+# a math span, marked by '¦' on both sides
+MATH_RE = re.compile(r"¦([^¦]*)¦")
 
-def merge_all(doc, prep=True, compound=True, phrase=True, punct=False, appos=True,conj=False):
+
+def merge_all(doc, prep=True, compound=True, phrase=True, punct=False, appos=True,conj=False, planned=False):
     """
         Merge prepositions, compound nouns, phrases, and punctuation into single tokens.
-    """
 
+        With planned=True the merges are planned on an overlay of the doc (see depcy.base.plan)
+        and applied in one retokenize, with the same result.
+    """
+    if planned and not isinstance(doc, Overlay):
+        return plan_all(doc, prep=prep, compound=compound, phrase=phrase, punct=punct, appos=appos, conj=conj).apply()
     if compound: doc = merge_compound_nouns(doc)
     if phrase: doc = merge_phrases(doc)
     if prep: 
@@ -234,10 +254,20 @@ def merge_all(doc, prep=True, compound=True, phrase=True, punct=False, appos=Tru
     if appos: doc = merge_appos(doc)
     return doc
 
+def merge_view(doc, prep=True, compound=True, phrase=True, punct=False, appos=True, conj=False):
+    """
+        The merges of merge_all as a view: an Overlay of doc whose tokens are the merged units.
+        doc is left alone, and the navigate and extract functions work on the view as on a merged doc.
+        A given overlay is copied first, so several views can share one parse.
+    """
+    overlay = doc.copy() if isinstance(doc, Overlay) else Overlay(doc)
+    return plan_all(overlay, prep=prep, compound=compound, phrase=phrase, punct=punct, appos=appos, conj=conj)
+
 def merge_noun_conjs(doc):
     """
         Merge conjunctions into single tokens.
     """
+    track(doc)
     with doc.retokenize() as retokenizer:
         spans = []
         for token in doc:
@@ -251,14 +281,17 @@ def merge_noun_conjs(doc):
                         spans.append(span)
                         # Merge the span into a single token
         filtered_spans = filter_spans(spans) # type: ignore
+        merged = [(span.start, span.end) for span in filtered_spans]
         for span in filtered_spans:
             retokenizer.merge(span)
+    record(doc, "merge_noun_conjs", merged)
     return doc
 
 def merge_noun_preps(doc):
     """
         Merge prepositions into single tokens.
     """
+    track(doc)
     with doc.retokenize() as retokenizer:
         spans = []
         for token in doc:
@@ -272,14 +305,17 @@ def merge_noun_preps(doc):
                         spans.append(span)
                         # Merge the span into a single token
         filtered_spans = filter_spans(spans)
+        merged = [(span.start, span.end) for span in filtered_spans]
         for span in filtered_spans:
             retokenizer.merge(span)
+    record(doc, "merge_noun_preps", merged)
     return doc
 
 def merge_prepositions(doc):
     """
         Merge prepositions into single tokens.
     """
+    track(doc)
     with doc.retokenize() as retokenizer:
         spans = []
         for token in doc:
@@ -293,14 +329,17 @@ def merge_prepositions(doc):
                         spans.append(span)
                         # Merge the span into a single token
         filtered_spans = filter_spans(spans)
+        merged = [(span.start, span.end) for span in filtered_spans]
         for span in filtered_spans:
             retokenizer.merge(span)
+    record(doc, "merge_prepositions", merged)
     return doc
 
 def merge_appos(doc, deps = ['appos']):
     """
         Merge apostrophe into single tokens.
     """
+    track(doc)
     with doc.retokenize() as retokenizer:
         spans = []
         for token in doc:
@@ -316,11 +355,14 @@ def merge_appos(doc, deps = ['appos']):
                     span = doc[start : end]
                     spans.append(span)
         filtered_spans = filter_spans(spans)
+        merged = [(span.start, span.end) for span in filtered_spans]
         for span in filtered_spans:
             retokenizer.merge(span)
+    record(doc, "merge_appos", merged)
     return doc
 
 def merge_verbs(doc):
+    track(doc)
     with doc.retokenize() as retokenizer:
         spans = []
         for token in doc:
@@ -336,21 +378,18 @@ def merge_verbs(doc):
                     if start < end:
                         span = doc[start : end]
                         spans.append(span)
+        merged = [(span.start, span.end) for span in spans]
         for span in spans:
             retokenizer.merge(span)
+    record(doc, "merge_verbs", merged)
     return doc
 
 def merge_compound_nouns(doc):
     """
         Merge compound nouns into single tokens.
     """
-    # Create a matcher to find compound nouns
-    matcher = Matcher(doc.vocab)
-    pattern = [{'DEP': 'compound'}, {'DEP': {'NOT_IN': ['punct', 'compound']}}]
-    matcher.add("COMPOUND_NOUN", [pattern])
-
-    # Find matches in the doc
-    matches = matcher(doc)
+    # Find compound nouns in the doc
+    matches = _compound_matches(doc)
 
     # Merge compound noun phrases
     spans = []  # To store the spans to merge
@@ -358,28 +397,39 @@ def merge_compound_nouns(doc):
         span = doc[start:end]  # The matched span
         spans.append(span)
 
+    merged = [(span.start, span.end) for span in spans]
+    track(doc)
     with doc.retokenize() as retokenizer:
         for span in spans:
             retokenizer.merge(span)
+    record(doc, "merge_compound_nouns", merged)
 
     return doc
 
+def _compound_matches(doc):
+    """Matches of a compound followed by a token that is neither punct nor compound"""
+    if isinstance(doc, Overlay): # the same pattern, as the Matcher does not run on overlays
+        return [(None, start, end) for start, end, _ in plan_compound(doc)]
+    return get_matcher(doc.vocab, "COMPOUND_NOUN")(doc)
+
 def merge_phrases(doc, avoid = []):
     """
         Merge noun phrases (noun_chunks) into single tokens.
     """
+    merges = []
+    for np in doc.noun_chunks:
+        attrs = {
+            "tag": np.root.tag_,
+            "lemma": np.root.lemma_,
+            "ent_type": np.root.ent_type_,
+        }
+        merges.append((np[1:] if np[0].pos_ in avoid else np, attrs))
+    merged = [(span.start, span.end) for span, _ in merges]
+    track(doc)
     with doc.retokenize() as retokenizer:
-        nps = doc.noun_chunks
-        for np in nps:
-            attrs = {
-                "tag": np.root.tag_,
-                "lemma": np.root.lemma_,
-                "ent_type": np.root.ent_type_,
-            }
-            if np[0].pos_ in avoid:
-                retokenizer.merge(np[1:], attrs=attrs)
-            else:
-                retokenizer.merge(np, attrs=attrs)
+        for span, attrs in merges:
+            retokenizer.merge(span, attrs=attrs)
+    record(doc, "merge_phrases", merged, [attrs for _, attrs in merges])
     return doc
 
 
@@ -397,58 +447,90 @@ def merge_punct(doc):
             end += 1
         span = doc[start:end]
         spans.append((span, word.tag_, word.lemma_, word.ent_type_))
+    merged = [(span.start, span.end) for span, *_ in spans]
+    track(doc)
     with doc.retokenize() as retokenizer:
         for span, tag, lemma, ent_type in spans:
             attrs = {"tag": tag, "lemma": lemma, "ent_type": ent_type}
             retokenizer.merge(span, attrs=attrs)
+    record(doc, "merge_punct", merged,
+           [{"tag": tag, "lemma": lemma, "ent_type": ent_type} for _, tag, lemma, ent_type in spans])
     return doc
 
 
 
 
 def merge_date(matcher,doc):
-    """Dates are merged into one token"""
+    """Dates are merged into one token (matcher: None for the shared DATE matcher of the vocab)"""
     logger.debug(f"merge_date: {doc}")
-    matcher.add("DATE", [[ {"ORTH": {"REGEX": r"\d\d"}}, {"ORTH": {"REGEX": r"\d\d"}},
-                           {"ORTH": {"REGEX": r"\d\d\d\d"}}]])
+    if matcher is None:
+        matcher = get_matcher(doc.vocab, "DATE")
+    elif "DATE" not in matcher: # add the pattern once, not on every call
+        matcher.add("DATE", PATTERNS["DATE"])
 
+    matches = matcher(doc)
+    track(doc)
     with doc.retokenize() as retokenizer:
-        for match_id, start, end in matcher(doc):
+        for match_id, start, end in matches:
             retokenizer.merge(doc[start:end])
+    record(doc, "merge_date", [(start, end) for _, start, end in matches])
     return doc
 
-def merge_math(matcher,doc):
-    """Marked math (via'¦') is merged into one token with text and math attributes. 
-    After merging, the text is replaced by 'MATH' and the is_math and math (orig tet)
-    attributes are set and the text is reparsed"""
+def math_doc(text, nlp=None):
+    """Tokenizes text with every marked math span (via '¦') as one 'MATH' token, with is_math and
+    math (orig text) attributes set, ready for the pipeline: nlp(math_doc(text)) parses it once"""
+    nlp = resolve_nlp(nlp)
+    words, spaces, maths = [], [], {}
+    position = 0
+    for match in MATH_RE.finditer(text):
+        _tokenize_into(nlp, text[position:match.start()], words, spaces)
+        maths[len(words)] = match.group(1).strip()
+        words.append("MATH")
+        spaces.append(text[match.end():match.end() + 1].isspace())
+        position = match.end() + spaces[-1] # the space is the MATH token's
+    _tokenize_into(nlp, text[position:], words, spaces)
+    doc = Doc(nlp.vocab, words=words, spaces=spaces)
+    for i, math in maths.items():
+        doc[i]._.is_math = True
+        doc[i]._.math = math
+    return doc
+
+def _tokenize_into(nlp, text, words, spaces):
+    if not text:
+        return
+    for token in nlp.tokenizer(text):
+        words.append(token.text)
+        spaces.append(bool(token.whitespace_))
+
+def parse_math(text, nlp=None):
+    """Parses text once, with all marked math spans (via '¦') protected as 'MATH' tokens (see math_doc)"""
+    nlp = resolve_nlp(nlp)
+    return nlp(math_doc(text, nlp))
+
+def merge_math(matcher,doc,nlp=None):
+    """Marked math (via'¦') is merged into one token with text and math attributes.
+    A doc is merged in place: each marked span becomes one PROPN token, which keeps its text,
+    with is_math and math (orig text) set. A text is parsed once by parse_math, with its math
+    spans replaced by 'MATH' (matcher is not used)."""
     logger.debug(f"merge_math: {doc}")
-    start_index = None
-    end_index = None
-    for i, token in enumerate(doc):
-        if token.text == "¦":
-            if start_index is None:
-                start_index = i
-            else:
-                end_index = i
-                break
-    if end_index is None or start_index is None:
+    if isinstance(doc, str):
+        return parse_math(doc, nlp)
+    spans = []
+    for match in MATH_RE.finditer(doc.text):
+        span = doc.char_span(match.start(), match.end(), alignment_mode="expand")
+        if span is not None:
+            spans.append((span, match.group(1).strip()))
+    kept = set(filter_spans([span for span, _ in spans]))
+    spans = [(span, math) for span, math in spans if span in kept]
+    if not spans:
         return doc
-    # Merge the tokens between the "¦" signs
-    # TODO: look for a better alternative to '¦' 
+    attrs = [{"TAG": "NN", "POS": "PROPN", "_": {"is_math": True, "math": math}} for _, math in spans]
+    track(doc)
     with doc.retokenize() as retokenizer:
-        span = Span(doc, start_index,  end_index+1)
-        span._.is_math = True
-        retokenizer.merge(span,attrs = {"TAG": "NN","POS": "PROPN","_": {"is_math": True}})
-    # a hack: as I could not found a way to change token.text, I am using 
-    # the token._.math attribute to store the original text
-    math_txts = {i:token.text.strip('¦').strip() for i, token in enumerate(doc) if token._.is_math}
-    text = " ".join([token.text if not token._.is_math else "MATH" for token in doc])
-    new_doc = nlp(text)
-    for i, token in enumerate(new_doc):
-        if token.text == "MATH":
-            token._.math = math_txts[i]
-            token._.is_math = True
-    return new_doc
+        for (span, _), span_attrs in zip(spans, attrs):
+            retokenizer.merge(span, attrs=span_attrs)
+    record(doc, "merge_math", [(span.start, span.end) for span, _ in spans], attrs)
+    return doc
 
 def split_sent_at_commas(doc):
     """Split sentences at commas"""
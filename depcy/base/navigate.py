@@ -16,6 +16,10 @@
 """
     This module contains functions to navigate the spacy dependency trees.
     Every function takes a spacy doc as input and returns a spacy tokens as output.
+    They run on the tree index of the doc (depcy.base.index), built once per parse and rebuilt when
+    depcy merges the doc. Heads set outside depcy (token.head = ..., doc.from_array) are not seen: the
+    index is checked in constant time, not against the whole tree. Call depcy.base.index.invalidate(doc)
+    after such edits.
 
     In python console use it like this:
     >>> import spacy
@@ -136,30 +140,28 @@
 
 from spacy.tokens.token import Token
 
+from depcy.base.index import tree_index
+
+def _tokens(doc, indices):
+    return [doc[i] for i in indices]
+
 def getRoot(token: Token):
     """Returns the root of the current token"""
     if token == None: return None
-    while token.dep_ != "ROOT":
-        token = token.head
-    return token
+    return token.doc[tree_index(token.doc).root(token.i)]
 
 def walk(token, stop, skip=[]):
     """Walks the dependency tree from the current token, stopping iteration at stop, yielding all tokens"""
-    if token == None or token == stop: return
-    yield token
-    for child in childs(token, skip=skip):
-        yield from walk(child, stop, skip=skip)
+    if token == None: return
+    stop = stop.i if stop is not None and stop.doc is token.doc else None
+    yield from _tokens(token.doc, tree_index(token.doc).walk(token.i, stop, skip=frozenset(skip)))
 
 # ancestors
         
 def ancestors(token, skip=[]):
     """Selects all ancestors (parent, grandparent, etc.) of the current token"""
     if token == None: return []
-    ancs = []
-    while token.dep_ != "ROOT":
-        token = token.head
-        ancs.append(token)
-    return sorted(ancs, key=lambda x: x.i)
+    return _tokens(token.doc, sorted(tree_index(token.doc).ancestors(token.i)))
 
 def ancestors_and_self(token, skip=[]):
     """Selects all ancestors (parent, grandparent, etc.) of the current token and the token itself"""
@@ -169,61 +171,64 @@ def ancestors_and_self(token, skip=[]):
 
 def childs(token, skip=[]):
     """Selects all children of the current token"""
-    return [child for child in token.children if child.dep_ not in skip]
+    return _tokens(token.doc, tree_index(token.doc).childs(token.i, skip=frozenset(skip)))
 
 # descendants
 
 def descendants(token, skip=[]):
     """Selects all descendants (children, grandchildren, etc.) of the current token"""
     if token == None: return []
-    descs = []
-    for child in childs(token, skip=skip):
-        if child.dep_ not in skip:
-            descs.append(child)
-            descs.extend(descendants(child, skip=skip))
-    return sorted(descs, key=lambda x: x.i)
+    return _tokens(token.doc, tree_index(token.doc).descendants(token.i, skip=frozenset(skip)))
 
 def descendants_and_self(token, skip=[]):
     """Selects all descendants (children, grandchildren, etc.) of the current token and the token itself"""
-    return sorted((descendants(token, skip=skip) + [token]), key=lambda x: x.i)
+    if token == None: return []
+    indices = tree_index(token.doc).descendants(token.i, skip=frozenset(skip))
+    return _tokens(token.doc, sorted(indices + [token.i]))
 
 
 def right_descendants(token, skip=[]):
     """Selects descendants after (sentence order) the current token in sentence order"""
-    return sorted([d for d in descendants(token, skip=skip) if d.i > token.i], key=lambda x: x.i)
+    indices = tree_index(token.doc).descendants(token.i, skip=frozenset(skip))
+    return _tokens(token.doc, [i for i in indices if i > token.i])
 
 def left_descendants(token, skip=[]):
     """Selects descendants before (sentence order) the current token in sentence order"""
-    return sorted([d for d in descendants(token, skip=skip) if d.i < token.i], key=lambda x: x.i)
+    indices = tree_index(token.doc).descendants(token.i, skip=frozenset(skip))
+    return _tokens(token.doc, [i for i in indices if i < token.i])
 
 # siblings
 
 def right_siblings(token, skip=[]):
     """Selects all siblings after the current token"""
-    siblings = [child for child in token.head.children if child.dep_ not in skip and child.i > token.i]
-    return sorted(siblings, key=lambda x: x.i)
+    index = tree_index(token.doc)
+    return _tokens(token.doc, [c for c in index.childs(index.parent[token.i], skip=frozenset(skip)) if c > token.i])
 
 def left_siblings(token, skip=[]):
     """Selects all siblings before the current token"""
-    siblings = [child for child in token.head.children if child.dep_ not in skip and child.i < token.i]
-    return sorted(siblings, key=lambda x: x.i)
+    index = tree_index(token.doc)
+    return _tokens(token.doc, [c for c in index.childs(index.parent[token.i], skip=frozenset(skip)) if c < token.i])
 
 # preceding
 
 def precedings(token, skip=[]):
     """Selects all tokens that appear before the current token in the document, originating from its left siblings"""
-    result = []
-    if token.dep_ == "ROOT": return result
-    for sibling in left_siblings(token, skip=skip):
-        result.extend(descendants_and_self(sibling, skip=skip))
-    return sorted(result+[token.head], key=lambda x: x.i)
+    index = tree_index(token.doc)
+    if index.deps[token.i] == "ROOT": return []
+    skip = frozenset(skip)
+    head = index.parent[token.i]
+    result = [head]
+    for sibling in index.childs(head, skip=skip):
+        if sibling < token.i:
+            result.append(sibling)
+            result.extend(index.descendants(sibling, skip=skip))
+    return _tokens(token.doc, sorted(result))
 
 def root_precedings(token, skip=[]):
     """Selects all tokens that appear before the current token in the sentence, originating from root"""
-    root = getRoot(token)
-    result = list(walk(root,token,skip=skip))
-    result = [r for r in result if r.i < token.i]
-    return sorted(result, key=lambda x: x.i)
+    index = tree_index(token.doc)
+    result = index.walk(index.root(token.i), token.i, skip=frozenset(skip))
+    return _tokens(token.doc, sorted(r for r in result if r < token.i))
 
 if __name__ == "__main__":
     import doctest
@@ -0,0 +1,623 @@
+# Copyright (C) 2023, 2024 Dr. Wolfgang Spahn
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+    This module contains a merge overlay: a virtual, merged view of a spacy doc.
+
+    The overlay groups the tokens of a doc into units (contiguous token ranges) with
+    their own head, dep, POS, tag, lemma and text. Its tokens and spans behave like
+    spacy tokens and spans, and it has a retokenize() that merges units by the same
+    rules as spacy's retokenizer, so the merge functions in depcy.base.merge run on
+    it unchanged - without touching the doc. apply() then merges the doc once.
+    The custom extensions of a unit (token._) are those of its first token, as on a merged doc.
+
+    In python console use it like this:
+    >>> import spacy
+    >>> nlp = spacy.load("en_core_web_sm")
+    >>> from depcy.base.merge import merge_compound_nouns, merge_phrases
+    >>> from depcy.utils import tree_view
+
+    >>> doc = nlp("The blue, red apple of the apple tree has been fallen.")
+    >>> overlay = merge_phrases(merge_compound_nouns(Overlay(doc)))
+    >>> tree_view(overlay)
+    +--fallen|VERB (ROOT|5)
+        +--The blue, red apple|NOUN (nsubjpass|0)
+        |   +--of|ADP (prep|1)
+        |       +--the apple tree|NOUN (pobj|2)
+        +--has|AUX (aux|3)
+        +--been|AUX (auxpass|4)
+        +--.|PUNCT (punct|6)
+    >>> len(doc)
+    13
+    >>> tree_view(overlay.apply())
+    +--fallen|VERB (ROOT|5)
+        +--The blue, red apple|NOUN (nsubjpass|0)
+        |   +--of|ADP (prep|1)
+        |       +--the apple tree|NOUN (pobj|2)
+        +--has|AUX (aux|3)
+        +--been|AUX (auxpass|4)
+        +--.|PUNCT (punct|6)
+"""
+import bisect
+import logging
+import operator
+
+import numpy
+from spacy.attrs import ORTH, HEAD, DEP, POS, TAG, LEMMA, ENT_IOB, ENT_TYPE, SPACY, IS_PUNCT, IS_SPACE, MORPH, IDX, LENGTH
+from spacy.parts_of_speech import IDS
+from spacy.strings import get_string_id
+from spacy.tokens import Doc
+
+from depcy.base.history import record, track
+from depcy.base.index import invalidate, subtree_edges
+
+logger = logging.getLogger(__name__)
+
+# the syntax_iterators noun_chunks of spacy's English language data
+NP_DEPS = {"oprd", "nsubj", "dobj", "nsubjpass", "pcomp", "pobj", "dative", "appos", "attr", "ROOT"}
+NP_POS = {"NOUN", "PROPN", "PRON"}
+# the ent_iob_ of spacy's ent_iob
+IOB_STRINGS = ("", "I", "O", "B")
+
+
+class Overlay:
+    """A merged view of doc: units of contiguous tokens with their own heads, deps, POS and text"""
+
+    def __init__(self, doc):
+        if isinstance(doc, Overlay):
+            doc = doc.doc
+        self.doc = doc
+        self.vocab = doc.vocab
+        strings = doc.vocab.strings
+        n = len(doc)
+        array = doc.to_array([HEAD, DEP, POS, TAG, LEMMA, ENT_IOB, ENT_TYPE, SPACY, IS_PUNCT, IS_SPACE, MORPH, IDX, LENGTH, ORTH])
+        self.starts = list(range(n))
+        self.ends = list(range(1, n + 1))
+        self.heads = (array[:, 0].astype("int64") + numpy.arange(n)).tolist()
+        self.deps = _strings(strings, array[:, 1])
+        self.pos = _strings(strings, array[:, 2])
+        self.tags = _strings(strings, array[:, 3])
+        self.lemmas = _strings(strings, array[:, 4])
+        self.ent_iobs = array[:, 5].tolist()
+        self.ent_types = _strings(strings, array[:, 6])
+        self.spaces = array[:, 7].astype(bool).tolist()
+        self.puncts = array[:, 8].astype(bool).tolist()
+        self.is_spaces = array[:, 9].astype(bool).tolist()
+        self.morphs = _strings(strings, array[:, 10])
+        self._orths = _strings(strings, array[:, 13])
+        self._tok_spaces = list(self.spaces)
+        self._text = None
+        self._tok_idx = array[:, 11].tolist()
+        self._tok_end = (array[:, 11] + array[:, 12]).tolist()
+        self._children = None
+        self._edges = None
+        self._sent_starts = None
+        self._index = None
+
+    # --- spacy Doc like interface
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        return (OverlayToken(self, i) for i in range(len(self.starts)))
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, end, _ = key.indices(len(self.starts))
+            return OverlaySpan(self, start, max(start, end))
+        if key < 0:
+            key += len(self.starts)
+        if not 0 <= key < len(self.starts):
+            raise IndexError(f"overlay index {key} out of range")
+        return OverlayToken(self, key)
+
+    def __repr__(self):
+        return self.text
+
+    @property
+    def text(self):
+        """The text of the doc, joined from the token texts once (without creating spacy tokens)"""
+        if self._text is None:
+            self._text = "".join(orth + " " if space else orth for orth, space in zip(self._orths, self._tok_spaces))
+        return self._text
+
+    @property
+    def noun_chunks(self):
+        """Base noun phrases, by the rules of spacy's English noun_chunks"""
+        prev_end = -1
+        for token in self:
+            if token.pos_ not in NP_POS:
+                continue
+            # Prevent nested chunks from being produced
+            if token.left_edge.i <= prev_end:
+                continue
+            if token.dep_ in NP_DEPS:
+                prev_end = token.i
+                yield self[token.left_edge.i:token.i + 1]
+            elif token.dep_ == "conj":
+                head = token.head
+                while head.dep_ == "conj" and head.head.i < head.i:
+                    head = head.head
+                # If the head is an NP, and we're coordinated to it, we're an NP
+                if head.dep_ in NP_DEPS:
+                    prev_end = token.i
+                    yield self[token.left_edge.i:token.i + 1]
+
+    @property
+    def sents(self):
+        """The sentences of the overlay, as spans of units"""
+        i = 0
+        while i < len(self.heads):
+            start, end = self.sent_bounds(i)
+            yield OverlaySpan(self, start, end)
+            i = end
+
+    def retokenize(self):
+        """Context manager collecting merges, applied to the overlay when the block ends"""
+        return OverlayRetokenizer(self)
+
+    # --- tree
+
+    def kids(self, i):
+        """The unit indices of all units headed by unit i, in order"""
+        if self._children is None:
+            # children grouped by head: kids of i are kids[offsets[i]:offsets[i + 1]]
+            heads = numpy.array(self.heads, dtype="int64")
+            units = numpy.arange(len(heads))
+            headed = heads != units
+            kids = units[headed][numpy.argsort(heads[headed], kind="stable")]
+            offsets = numpy.concatenate(([0], numpy.cumsum(numpy.bincount(heads[headed], minlength=len(heads)))))
+            self._children = (kids.tolist(), offsets.tolist())
+        kids, offsets = self._children
+        return kids[offsets[i]:offsets[i + 1]]
+
+    def children(self, i):
+        """The unit indices of the children of unit i, in order (within its edges, as spacy finds them)"""
+        left, right = self.edges(i)
+        return [c for c in self.kids(i) if left <= c <= right]
+
+    def edges(self, i):
+        """The (left, right) edge of the subtree of unit i"""
+        if self._edges is None:
+            self._edges = subtree_edges(self.heads)
+        return self._edges[0][i], self._edges[1][i]
+
+    def sent_bounds(self, i):
+        """The (start, end) units of the sentence of unit i: from the left edge of a root to the next, as spacy finds them"""
+        if self._sent_starts is None:
+            roots = [j for j, head in enumerate(self.heads) if head == j]
+            self._sent_starts = sorted({0} | {self.edges(r)[0] for r in roots})
+        k = bisect.bisect_right(self._sent_starts, i)
+        starts = self._sent_starts
+        return starts[k - 1], starts[k] if k < len(starts) else len(self.heads)
+
+    def is_punct(self, i):
+        if self.puncts[i] is None:
+            text = self.text_of(i)
+            getters = self.vocab.lex_attr_getters
+            if text in self.vocab or IS_PUNCT not in getters or IS_SPACE not in getters:
+                lexeme = self.vocab[text]
+                self.puncts[i], self.is_spaces[i] = lexeme.is_punct, lexeme.is_space
+            else: # the flags the lexeme would get, without adding it to the vocab
+                self.puncts[i], self.is_spaces[i] = getters[IS_PUNCT](text), getters[IS_SPACE](text)
+        return self.puncts[i]
+
+    def is_space(self, i):
+        self.is_punct(i)
+        return self.is_spaces[i]
+
+    def text_of(self, i):
+        start, end = self.starts[i], self.ends[i]
+        if end - start == 1:
+            return self._orths[start]
+        return self.text[self._tok_idx[start]:self._tok_end[end - 1]]
+
+    # --- merging
+
+    def _root(self, start, end):
+        """The unit with the shortest path to the root, like spacy's Span.root"""
+        heads = self.heads
+        for i in range(start, end):
+            if heads[i] == i:
+                return i
+        best, root = len(heads), -1
+        for i in range(start, end):
+            if start <= heads[i] < end:
+                continue
+            if (self.is_punct(i) or self.is_space(i)) and not self.kids(i):
+                n = len(heads) - 1 # don't allow punctuation or spaces to be the root if there are better candidates
+            else:
+                n, j = 0, i
+                while heads[j] != j and n < len(heads):
+                    j = heads[j]
+                    n += 1
+            if n < best:
+                best, root = n, i
+        return start if root == -1 else root
+
+    def merge(self, merges):
+        """Merge (start, end, attrs) unit ranges into single units, by the rules of spacy's retokenizer"""
+        merges = sorted(merges, key=lambda m: m[0])
+        n = len(self.starts)
+        previous_end = 0
+        merged = []
+        for start, end, attrs in merges:
+            if start < previous_end:
+                raise ValueError(f"overlapping merges at unit {start}")
+            previous_end = end
+            merged.append((start, end, self._merged_unit(start, end, attrs)))
+        if not merged:
+            return self
+        # old unit -> new unit, shifted left by the units merged away before it,
+        # and the old units kept (a merged range keeps its start, to be replaced by the merged unit)
+        index, kept, replaced = [], [], []
+        previous_end = shift = 0
+        for start, end, _ in merged:
+            index.extend(range(previous_end - shift, start - shift))
+            index.extend([start - shift] * (end - start))
+            kept.extend(range(previous_end, start + 1))
+            replaced.append(start - shift)
+            shift += end - start - 1
+            previous_end = end
+        index.extend(range(previous_end - shift, n - shift))
+        kept.extend(range(previous_end, n))
+        take = operator.itemgetter(*kept) if len(kept) > 1 else lambda old: (old[kept[0]],)
+        for field in FIELDS + ("heads",):
+            new = list(take(getattr(self, field)))
+            for position, (_, _, unit) in zip(replaced, merged):
+                new[position] = unit[field]
+            setattr(self, field, new)
+        self.heads = [index[h] for h in self.heads]
+        _make_iob_consistent(self.ent_iobs, self.ent_types)
+        self._children = None
+        self._edges = None
+        self._sent_starts = None
+        self._index = None
+        return self
+
+    def _merged_unit(self, start, end, attrs):
+        root = self._root(start, end)
+        unit = {
+            "starts": self.starts[start],
+            "ends": self.ends[end - 1],
+            "heads": self.heads[root],
+            "deps": self.deps[root],
+            "pos": self.pos[root],
+            "tags": self.tags[root],
+            "morphs": self.morphs[root],
+            "ent_types": self.ent_types[root],
+            "spaces": self.spaces[end - 1],
+            "lemmas": "".join(self.lemmas[i] + (" " if self.spaces[i] else "") for i in range(start, end)).strip(),
+        }
+        # If span root is part of an entity, merged token is B-ENT, or I-ENT continuing one
+        iob = self.ent_iobs[root]
+        if iob in (1, 3):
+            iob = 3
+            if self.ent_iobs[start] == 1 and start > 0 and self.ent_types[start] == unit["ent_types"] \
+                    and self.ent_types[start - 1] == unit["ent_types"]:
+                iob = 1
+        unit["ent_iobs"] = iob
+        for key, value in attrs.items():
+            key = key.lower()
+            if key in ATTR_FIELDS:
+                unit[ATTR_FIELDS[key]] = value
+        unit["puncts"] = unit["is_spaces"] = None # looked up on demand, see is_punct
+        return unit
+
+    def apply(self):
+        """Merge the doc once into the units of the overlay, and return it"""
+        doc = self.doc
+        merged = [i for i, (start, end) in enumerate(zip(self.starts, self.ends)) if end - start > 1]
+        attrs = [{"TAG": self.tags[i], "POS": self.pos[i], "MORPH": self.morphs[i], "LEMMA": self.lemmas[i],
+                  "DEP": self.deps[i], "ENT_TYPE": self.ent_types[i], "ENT_IOB": self.ent_iobs[i]} for i in merged]
+        track(doc)
+        with doc.retokenize() as retokenizer:
+            for i, span_attrs in zip(merged, attrs):
+                retokenizer.merge(doc[self.starts[i]:self.ends[i]], attrs=span_attrs)
+        # the retokenizer takes the head of each span root; the overlay may have chosen another root
+        array = doc.to_array([HEAD, DEP])
+        heads = numpy.array(self.heads, dtype="int64") - numpy.arange(len(doc))
+        if (array[:, 0].astype("int64") != heads).any():
+            array[:, 0] = heads.astype(array.dtype)
+            doc.from_array([HEAD, DEP], array)
+            invalidate(doc)
+        record(doc, "Overlay.apply", [(self.starts[i], self.ends[i]) for i in merged], attrs, list(self.heads))
+        return doc
+
+    def to_doc(self):
+        """A new doc with the units of the overlay as tokens, leaving the underlying doc alone"""
+        copy = self.copy()
+        copy.doc = self.doc.copy()
+        return copy.apply()
+
+    def copy(self):
+        """Another view of the same doc, to be merged on its own: the doc and token data are shared, the units copied"""
+        copy = Overlay.__new__(Overlay)
+        copy.__dict__.update(self.__dict__)
+        for field in FIELDS + ("heads",):
+            setattr(copy, field, list(getattr(self, field)))
+        return copy
+
+
+# the per unit lists, besides the heads
+FIELDS = ("starts", "ends", "deps", "pos", "tags", "lemmas", "ent_iobs", "ent_types", "spaces", "puncts", "is_spaces", "morphs")
+ATTR_FIELDS = {"tag": "tags", "pos": "pos", "lemma": "lemmas", "ent_type": "ent_types",
+               "dep": "deps", "morph": "morphs", "ent_iob": "ent_iobs"}
+
+
+def _strings(strings, column):
+    """The strings of a column of hashes, looking up each distinct hash once"""
+    hashes, inverse = numpy.unique(column, return_inverse=True)
+    names = [strings[h] for h in hashes.tolist()]
+    return [names[k] for k in inverse.tolist()]
+
+def _make_iob_consistent(iobs, types):
+    if iobs and iobs[0] == 1:
+        iobs[0] = 3
+    for i in range(1, len(iobs)):
+        if iobs[i] == 1 and types[i - 1] != types[i]:
+            iobs[i] = 3
+
+class OverlayRetokenizer:
+    """Collects merges like spacy's retokenizer and applies them to the overlay on exit"""
+
+    def __init__(self, overlay):
+        self.overlay = overlay
+        self.merges = []
+
+    def merge(self, span, attrs={}):
+        self.merges.append((span.start, span.end, attrs))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if exc[0] is None:
+            self.overlay.merge(self.merges)
+
+
+class OverlayToken:
+    """A unit of an overlay, with the interface of a spacy Token"""
+
+    __slots__ = ("doc", "i")
+
+    def __init__(self, overlay, i):
+        self.doc = overlay
+        self.i = i
+
+    def __eq__(self, other):
+        return isinstance(other, OverlayToken) and other.i == self.i and other.doc is self.doc
+
+    def __hash__(self):
+        return hash((id(self.doc), self.i))
+
+    def __repr__(self):
+        return self.text
+
+    def __str__(self):
+        return self.text
+
+    def __len__(self):
+        return len(self.text)
+
+    @property
+    def text(self):
+        return self.doc.text_of(self.i)
+
+    @property
+    def orth_(self):
+        return self.text
+
+    @property
+    def whitespace_(self):
+        return " " if self.doc.spaces[self.i] else ""
+
+    @property
+    def text_with_ws(self):
+        return self.text + self.whitespace_
+
+    @property
+    def idx(self):
+        return self.doc._tok_idx[self.doc.starts[self.i]]
+
+    @property
+    def dep_(self):
+        return self.doc.deps[self.i]
+
+    @property
+    def dep(self):
+        return get_string_id(self.doc.deps[self.i])
+
+    @property
+    def pos_(self):
+        return self.doc.pos[self.i]
+
+    @property
+    def pos(self):
+        return int(IDS.get(self.doc.pos[self.i], 0))
+
+    @property
+    def tag_(self):
+        return self.doc.tags[self.i]
+
+    @property
+    def lemma_(self):
+        return self.doc.lemmas[self.i]
+
+    @property
+    def ent_type_(self):
+        return self.doc.ent_types[self.i]
+
+    @property
+    def ent_iob(self):
+        return self.doc.ent_iobs[self.i]
+
+    @property
+    def ent_iob_(self):
+        return IOB_STRINGS[self.doc.ent_iobs[self.i]]
+
+    @property
+    def morph(self):
+        return self.doc.morphs[self.i]
+
+    @property
+    def is_punct(self):
+        return self.doc.is_punct(self.i)
+
+    @property
+    def is_space(self):
+        return self.doc.is_space(self.i)
+
+    @property
+    def tokens(self):
+        """The tokens of the underlying doc in this unit"""
+        return self.doc.doc[self.doc.starts[self.i]:self.doc.ends[self.i]]
+
+    @property
+    def _(self):
+        """The custom extensions of the first token of the unit, as spacy keeps them for a merged token"""
+        return self.doc.doc[self.doc.starts[self.i]]._
+
+    @property
+    def vector(self):
+        """The vector of the unit: the mean of its token vectors, as for a spacy Span"""
+        return self.tokens.vector
+
+    @property
+    def has_vector(self):
+        return self.tokens.has_vector
+
+    @property
+    def sent(self):
+        return OverlaySpan(self.doc, *self.doc.sent_bounds(self.i))
+
+    @property
+    def head(self):
+        return OverlayToken(self.doc, self.doc.heads[self.i])
+
+    @property
+    def children(self):
+        return (OverlayToken(self.doc, c) for c in self.doc.children(self.i))
+
+    @property
+    def lefts(self):
+        return (OverlayToken(self.doc, c) for c in self.doc.children(self.i) if c < self.i)
+
+    @property
+    def rights(self):
+        return (OverlayToken(self.doc, c) for c in self.doc.children(self.i) if c > self.i)
+
+    @property
+    def n_lefts(self):
+        return sum(1 for c in self.doc.children(self.i) if c < self.i)
+
+    @property
+    def n_rights(self):
+        return sum(1 for c in self.doc.children(self.i) if c > self.i)
+
+    @property
+    def subtree(self):
+        # in order, on a stack of (unit, its children pushed): no recursion on deep trees
+        stack = [(self.i, False)]
+        while stack:
+            i, expanded = stack.pop()
+            if expanded:
+                yield OverlayToken(self.doc, i)
+                continue
+            children = self.doc.children(i)
+            stack.extend((c, False) for c in reversed(children) if c > i)
+            stack.append((i, True))
+            stack.extend((c, False) for c in reversed(children) if c < i)
+
+    @property
+    def left_edge(self):
+        return OverlayToken(self.doc, self.doc.edges(self.i)[0])
+
+    @property
+    def right_edge(self):
+        return OverlayToken(self.doc, self.doc.edges(self.i)[1])
+
+    @property
+    def ancestors(self):
+        token = self
+        while token.doc.heads[token.i] != token.i:
+            token = token.head
+            yield token
+
+    @property
+    def conjuncts(self):
+        start = self
+        while start.i != start.head.i and start.dep_ == "conj":
+            start = start.head
+        queue = [start]
+        output = [start]
+        for word in queue:
+            for child in word.rights:
+                if child.dep_ == "conj":
+                    output.append(child)
+                    queue.append(child)
+        return tuple(w for w in output if w.i != self.i)
+
+    def nbor(self, i=1):
+        return self.doc[self.i + i]
+
+    def is_ancestor(self, descendant):
+        return any(a == self for a in descendant.ancestors)
+
+
+class OverlaySpan:
+    """A slice of overlay units, with the interface of a spacy Span"""
+
+    __slots__ = ("doc", "start", "end")
+
+    def __init__(self, overlay, start, end):
+        self.doc = overlay
+        self.start = start
+        self.end = end
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __iter__(self):
+        return (OverlayToken(self.doc, i) for i in range(self.start, self.end))
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, end, _ = key.indices(len(self))
+            return OverlaySpan(self.doc, self.start + start, self.start + max(start, end))
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError(f"span index {key} out of range")
+        return OverlayToken(self.doc, self.start + key)
+
+    def __repr__(self):
+        return self.text
+
+    @property
+    def text(self):
+        if self.start >= self.end:
+            return ""
+        overlay = self.doc
+        return overlay.text[overlay._tok_idx[overlay.starts[self.start]]:overlay._tok_end[overlay.ends[self.end - 1] - 1]]
+
+    @property
+    def root(self):
+        return OverlayToken(self.doc, self.doc._root(self.start, self.end))
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,198 @@
+# Copyright (C) 2023, 2024 Dr. Wolfgang Spahn
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+    This module plans the merges of merge_all on an overlay, to apply them in one retokenize.
+
+    Every plan function is the rule of a merge function in depcy.base.merge, working on
+    the unit lists of an Overlay instead of spacy tokens. It returns the (start, end, attrs)
+    spans that merge function would merge. plan_all runs them in the order of merge_all,
+    merging the overlay after each step, so later steps see the earlier merges.
+
+    In python console use it like this:
+    >>> import spacy
+    >>> nlp = spacy.load("en_core_web_sm")
+    >>> from depcy.utils import tree_view
+
+    >>> doc = nlp("The blue, red apple of the apple tree has been fallen.")
+    >>> plan_compound(Overlay(doc))
+    [(7, 9, {})]
+    >>> overlay = plan_all(doc)
+    >>> [overlay.text_of(i) for i in range(len(overlay))]
+    ['The blue, red apple of the apple tree', 'has', 'been', 'fallen', '.']
+    >>> tree_view(overlay.apply())
+    +--fallen|VERB (ROOT|3)
+        +--The blue, red apple of the apple tree|NOUN (nsubjpass|0)
+        +--has|AUX (aux|1)
+        +--been|AUX (auxpass|2)
+        +--.|PUNCT (punct|4)
+"""
+import logging
+
+from depcy.base.overlay import Overlay, NP_DEPS, NP_POS
+
+logger = logging.getLogger(__name__)
+
+NOUNS = ("NOUN", "PROPN")
+
+# the flags of merge_all and their defaults
+DEFAULTS = {"prep": True, "compound": True, "phrase": True, "punct": False, "appos": True, "conj": False}
+
+
+def plan_all(doc, prep=True, compound=True, phrase=True, punct=False, appos=True, conj=False):
+    """
+        Plan the merges of merge_all on an overlay of doc, in the same order, without
+        changing the doc. Returns the overlay, its apply() merges the doc in one retokenize.
+    """
+    overlay = doc if isinstance(doc, Overlay) else Overlay(doc)
+    for step in passes(prep=prep, compound=compound, phrase=phrase, punct=punct, appos=appos, conj=conj):
+        overlay.merge(PASSES[step][1](overlay))
+    return overlay
+
+def passes(**flags):
+    """The indices into PASSES of the passes merge_all runs for flags (missing flags take the defaults of merge_all)"""
+    unknown = set(flags) - set(DEFAULTS)
+    if unknown:
+        raise TypeError(f"unknown merge flags {sorted(unknown)}")
+    flags = {**DEFAULTS, **flags}
+    return tuple(step for step, (flag, _) in enumerate(PASSES) if flags[flag])
+
+def plan_compound(overlay):
+    """merge_compound_nouns: a compound followed by a token that is neither punct nor compound"""
+    deps = overlay.deps
+    return [(i, i + 2, {}) for i in range(len(deps) - 1)
+            if deps[i] == 'compound' and deps[i + 1] not in ('punct', 'compound')]
+
+def plan_phrases(overlay):
+    """merge_phrases: the noun chunks, with tag, lemma and ent_type of their root"""
+    spans = []
+    deps, pos, heads = overlay.deps, overlay.pos, overlay.heads
+    prev_end = -1
+    for i in range(len(deps)):
+        if pos[i] not in NP_POS:
+            continue
+        left = overlay.edges(i)[0]
+        # Prevent nested chunks from being produced
+        if left <= prev_end:
+            continue
+        if deps[i] not in NP_DEPS:
+            if deps[i] != "conj":
+                continue
+            head = heads[i]
+            while deps[head] == "conj" and heads[head] < head:
+                head = heads[head]
+            # If the head is an NP, and we're coordinated to it, we're an NP
+            if deps[head] not in NP_DEPS:
+                continue
+        prev_end = i
+        root = overlay._root(left, i + 1)
+        spans.append((left, i + 1, {"tag": overlay.tags[root], "lemma": overlay.lemmas[root],
+                                    "ent_type": overlay.ent_types[root]}))
+    return spans
+
+def plan_prepositions(overlay):
+    """merge_prepositions: a noun with its 'of' preposition and the preposition's children"""
+    deps, pos, heads = overlay.deps, overlay.pos, overlay.heads
+    spans = []
+    for i in range(len(deps)):
+        if deps[i] == 'prep' and pos[heads[i]] in NOUNS and overlay.text_of(i) == 'of':
+            idxs = [heads[i], i] + overlay.children(i)
+            spans.append((min(idxs), max(idxs) + 1, {}))
+    return filter_spans(spans)
+
+def plan_punct(overlay):
+    """merge_punct: a token with the punctuation following it"""
+    n = len(overlay)
+    spans = []
+    for i in range(n - 1):
+        if overlay.is_punct(i) or not overlay.is_punct(i + 1):
+            continue
+        end = i + 1
+        while end < n and overlay.is_punct(end):
+            end += 1
+        spans.append((i, end, {"tag": overlay.tags[i], "lemma": overlay.lemmas[i], "ent_type": overlay.ent_types[i]}))
+    return spans
+
+def plan_noun_conjs(overlay):
+    """merge_noun_conjs: a noun conjunct with all its conjuncts"""
+    deps, pos, heads = overlay.deps, overlay.pos, overlay.heads
+    spans = []
+    for i in range(len(deps)):
+        if deps[i] == 'conj' and pos[i] in NOUNS:
+            idxs = [i] + _conjuncts(overlay, i)
+            spans.append((min(idxs), max(idxs) + 1, {}))
+    return filter_spans(spans)
+
+def plan_appos(overlay, deps=('appos',)):
+    """merge_appos: an apposition with the preceding sibling phrases (or its head) and the following punct"""
+    pos, heads = overlay.pos, overlay.heads
+    spans = []
+    for i in range(len(pos)):
+        if overlay.deps[i] not in deps:
+            continue
+        siblings = overlay.children(heads[i])
+        preds = [p for child in siblings if child < i and pos[child] != "PUNCT"
+                   for p in _subtree(overlay, child) if pos[p]]
+        succs = [child for child in siblings if child > i and pos[child] == "PUNCT"]
+        start = max(preds) if preds else (heads[i] if pos[heads[i]] in NOUNS else i)
+        end = min(succs) + 1 if succs else i + 1
+        if start < end:
+            spans.append((start, end, {}))
+    return filter_spans(spans)
+
+# the passes of merge_all in their order, with the flag switching them on
+PASSES = (("compound", plan_compound), ("phrase", plan_phrases), ("prep", plan_prepositions),
+          ("prep", plan_prepositions), ("punct", plan_punct), ("conj", plan_noun_conjs), ("appos", plan_appos))
+
+# --- helpers
+
+def filter_spans(spans):
+    """spacy.util.filter_spans for (start, end, attrs) spans: the (first) longest of overlapping spans wins"""
+    result = []
+    seen = set()
+    for span in sorted(spans, key=lambda s: (s[1] - s[0], -s[0]), reverse=True):
+        if span[0] not in seen and span[1] - 1 not in seen:
+            result.append(span)
+            seen.update(range(span[0], span[1]))
+    return sorted(result, key=lambda s: s[0])
+
+def _subtree(overlay, i):
+    """The units of the subtree of unit i"""
+    units = [i]
+    stack = [i]
+    while stack:
+        children = overlay.children(stack.pop())
+        units.extend(children)
+        stack.extend(children)
+    return units
+
+def _conjuncts(overlay, i):
+    """The units coordinated with unit i, like spacy's Token.conjuncts"""
+    deps, heads = overlay.deps, overlay.heads
+    start = i
+    while heads[start] != start and deps[start] == "conj":
+        start = heads[start]
+    queue = [start]
+    output = [start]
+    for word in queue:
+        for child in overlay.children(word):
+            if child > word and deps[child] == "conj":
+                output.append(child)
+                queue.append(child)
+    return [w for w in output if w != i]
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
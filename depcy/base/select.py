@@ -0,0 +1,151 @@
+# Copyright (C) 2023, 2024 Dr. Wolfgang Spahn
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+    This module selects tokens by dep, POS and head on whole arrays, the base of the selectors of depcy.extract.
+
+    The POS, DEP and HEAD of all tokens of a doc are taken at once with doc.to_array([POS, DEP, HEAD]),
+    and kept until the doc is retokenized (see depcy.base.index.doc_key). Heads or deps set outside depcy
+    (token.head = ..., doc.from_array) are not seen until depcy.base.index.invalidate(doc).
+    The deps and POS asked for are turned into their integer IDs once, and a selection is a numpy
+    mask over the arrays: no string is looked up per token. select returns index arrays.
+    Plain lists of tokens (like token.children) are few: their integer IDs are compared one by one.
+
+    In python console use it like this:
+    >>> import spacy
+    >>> nlp = spacy.load("en_core_web_sm")
+
+    >>> doc = nlp("The soldier and the teacher walk home and take supper.")
+    >>> select(doc, pos=["VERB", "AUX"]).tolist()
+    [5, 8]
+    >>> select(doc, dep=["nsubj"]).tolist(), select(doc, head=5).tolist()
+    ([1], [1, 6, 7, 8, 10])
+    >>> select_tokens(doc[5].children, dep=["cc", "conj"])
+    [and, take]
+    >>> first(doc, dep=["ROOT"])
+    walk
+"""
+import functools
+import logging
+import weakref
+
+import numpy
+from spacy.attrs import POS, DEP, HEAD
+from spacy.parts_of_speech import IDS
+from spacy.strings import get_string_id
+from spacy.tokens import Doc, Span
+
+from depcy.base.index import doc_key
+from depcy.base.overlay import Overlay, OverlaySpan
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=None)
+def dep_ids(deps):
+    """The IDs of a tuple of dep labels, as a frozenset"""
+    return frozenset(get_string_id(dep) for dep in deps)
+
+@functools.lru_cache(maxsize=None)
+def pos_ids(pos):
+    """The IDs of a tuple of POS tags, as a frozenset"""
+    return frozenset(int(IDS[p]) for p in pos)
+
+
+_arrays = weakref.WeakKeyDictionary()
+
+
+def token_arrays(doc):
+    """The POS IDs, DEP IDs and absolute HEAD indices of all tokens of doc (a spacy Doc or a depcy Overlay)"""
+    if isinstance(doc, Doc):
+        key = doc_key(doc)
+        cached = _arrays.get(doc)
+        if cached is None or cached[0] != key:
+            array = doc.to_array([POS, DEP, HEAD])
+            cached = (key, (array[:, 0], array[:, 1], array[:, 2].astype("int64") + numpy.arange(len(doc))))
+            _arrays[doc] = cached
+        return cached[1]
+    # an overlay replaces its lists when it merges
+    cached = _arrays.get(doc)
+    if cached is None or cached[0] is not doc.pos or cached[1] is not doc.deps or cached[2] is not doc.heads:
+        arrays = (numpy.array([int(IDS.get(p, 0)) for p in doc.pos], dtype="uint64"),
+                  numpy.array([get_string_id(dep) for dep in doc.deps], dtype="uint64"),
+                  numpy.array(doc.heads, dtype="int64"))
+        cached = (doc.pos, doc.deps, doc.heads, arrays)
+        _arrays[doc] = cached
+    return cached[3]
+
+def _mask(column, ids):
+    """Where column holds one of ids (a few: equality masks are faster than numpy.isin)"""
+    mask = numpy.zeros(len(column), dtype=bool)
+    for id_ in ids:
+        mask |= column == column.dtype.type(id_)
+    return mask
+
+def _select(doc, start, end, dep=None, pos=None, head=None):
+    """The indices start..end of doc, selected"""
+    pos_array, dep_array, head_array = token_arrays(doc)
+    mask = numpy.ones(end - start, dtype=bool)
+    if dep is not None:
+        mask &= _mask(dep_array[start:end], dep_ids(tuple(dep)))
+    if pos is not None:
+        mask &= _mask(pos_array[start:end], pos_ids(tuple(pos)))
+    if head is not None:
+        mask &= head_array[start:end] == head
+        if start <= head < end:
+            mask[head - start] = False
+    return numpy.flatnonzero(mask) + start
+
+def _selected(tokens, dep=None, pos=None, head=None):
+    """The selected tokens of an iterable of tokens, comparing their integer dep and POS IDs"""
+    deps = dep_ids(tuple(dep)) if dep is not None else None
+    poss = pos_ids(tuple(pos)) if pos is not None else None
+    return (token for token in tokens
+            if (deps is None or token.dep in deps) and (poss is None or token.pos in poss)
+            and (head is None or (token.head.i == head and token.i != head)))
+
+def select(tokens, dep=None, pos=None, head=None):
+    """
+        The indices of the tokens (a doc, span or iterable of tokens) with a dep in dep, a POS in pos
+        and the given head (None: any), in the order of tokens
+    """
+    if isinstance(tokens, (Doc, Overlay)):
+        return _select(tokens, 0, len(tokens), dep=dep, pos=pos, head=head)
+    if isinstance(tokens, (Span, OverlaySpan)):
+        return _select(tokens.doc, tokens.start, tokens.end, dep=dep, pos=pos, head=head)
+    return numpy.array([token.i for token in _selected(tokens, dep=dep, pos=pos, head=head)], dtype="int64")
+
+def iter_tokens(tokens, dep=None, pos=None, head=None):
+    """Yields the tokens selected as by select, creating each token only when it is asked for"""
+    if isinstance(tokens, (Doc, Overlay, Span, OverlaySpan)):
+        doc = tokens if isinstance(tokens, (Doc, Overlay)) else tokens.doc
+        return (doc[i] for i in select(tokens, dep=dep, pos=pos, head=head).tolist())
+    return _selected(tokens, dep=dep, pos=pos, head=head)
+
+def select_tokens(tokens, dep=None, pos=None, head=None):
+    """The tokens selected as by select"""
+    return list(iter_tokens(tokens, dep=dep, pos=pos, head=head))
+
+def first(tokens, dep=None, pos=None, head=None):
+    """The first token selected as by select, or None"""
+    if isinstance(tokens, (Doc, Overlay, Span, OverlaySpan)):
+        doc = tokens if isinstance(tokens, (Doc, Overlay)) else tokens.doc
+        selected = select(tokens, dep=dep, pos=pos, head=head)
+        return doc[int(selected[0])] if len(selected) else None
+    return next(_selected(tokens, dep=dep, pos=pos, head=head), None)
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
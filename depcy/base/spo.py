@@ -0,0 +1,109 @@
+# Copyright (C) 2023, 2024 Dr. Wolfgang Spahn
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+    This module contains a compact record of a subject-predicate-object triple, as depcy.extract finds them.
+
+    An SPO keeps the token indices and the char offsets of its subject, verb and objects, and
+    optionally their interned strings - but no reference to the doc. A queue of records does
+    not keep the parsed docs alive; given the doc (or the view it was found on), the record gives
+    back its tokens, and given the doc text (or with its strings) its phrase.
+
+    In python console use it like this:
+    >>> import spacy
+    >>> nlp = spacy.load("en_core_web_sm")
+    >>> from depcy.extract import get_SPOs, phrasesToStr
+
+    >>> doc = nlp("The soldier reads a book about the history of Rome.")
+    >>> spo = SPO.from_tokens(get_SPOs(doc)[0])
+    >>> spo
+    SPO(1, 2, (3, 4, 5, 6, 7, 8, 9))
+    >>> spo.obj_offsets
+    ((18, 50),)
+    >>> phrasesToStr(spo, doc)
+    'soldier reads a book about the history of Rome'
+    >>> spo.tokens(doc)
+    [soldier, reads, [a, book, about, the, history, of, Rome]]
+    >>> SPO.from_tokens(get_SPOs(doc)[0], strings=True).text()
+    'soldier reads a book about the history of Rome'
+    >>> spo.text(doc=doc.text)
+    'soldier reads a book about the history of Rome'
+"""
+import logging
+import sys
+
+from depcy.base.string import docText, toOffsets
+
+logger = logging.getLogger(__name__)
+
+
+class SPO:
+    """A subject-predicate-object triple by token indices and char offsets, without its doc"""
+
+    __slots__ = ("subj", "verb", "objs", "subj_offsets", "verb_offsets", "obj_offsets", "strings")
+
+    def __init__(self, subj, verb, objs, subj_offsets, verb_offsets, obj_offsets, strings=None):
+        self.subj = subj
+        self.verb = verb
+        self.objs = objs
+        self.subj_offsets = subj_offsets
+        self.verb_offsets = verb_offsets
+        self.obj_offsets = obj_offsets
+        self.strings = strings
+
+    @classmethod
+    def from_tokens(cls, spo, strings=False):
+        """The record of a [subject, verb, [objects]] triple of get_SPOs, with its interned strings if strings"""
+        subj, verb, objs = spo
+        record = cls(subj.i, verb.i, tuple(o.i for o in objs),
+                     (subj.idx, subj.idx + len(subj)), (verb.idx, verb.idx + len(verb)), tuple(toOffsets(objs)))
+        if strings:
+            text = docText(subj.doc)
+            record.strings = tuple(sys.intern(s) for s in record._strings(text))
+        return record
+
+    def _strings(self, text):
+        (s0, s1), (v0, v1) = self.subj_offsets, self.verb_offsets
+        return text[s0:s1], text[v0:v1], " ".join(text[start:end] for start, end in self.obj_offsets)
+
+    def tokens(self, doc):
+        """The [subject, verb, [objects]] tokens of the record in doc, the doc (or view) it was found on"""
+        return [doc[self.subj], doc[self.verb], [doc[i] for i in self.objs]]
+
+    def text(self, doc=None):
+        """The phrase of the record, as phrasesToStr: from its strings, or sliced from the text of doc"""
+        if doc is not None:
+            strings = self._strings(doc if isinstance(doc, str) else docText(doc))
+        elif self.strings is not None:
+            strings = self.strings
+        else:
+            raise ValueError("SPO.text: a record without strings needs the doc (or its text)")
+        return "{} {} {}".format(*strings)
+
+    def __eq__(self, other):
+        return isinstance(other, SPO) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def _key(self):
+        return self.subj, self.verb, self.objs, self.subj_offsets, self.verb_offsets, self.obj_offsets
+
+    def __repr__(self):
+        return f"SPO({self.subj}, {self.verb}, {self.objs})"
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
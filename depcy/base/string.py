@@ -18,7 +18,7 @@
     In python console use it like this:
     >>> import spacy
     >>> nlp = spacy.load("en_core_web_sm")
-    >>> from depcy.base.string import toStr, toStrs, toStrSub, toStrLeft, toStrRight
+    >>> from depcy.base.string import toStr, toStrs, toStrSub, toStrLeft, toStrRight, toOffsetsRight
     >>> from depcy.utils import tree_view
 
     1) concatenate text of tokens to a string in sentence order
@@ -64,22 +64,101 @@
     >>> print(toStrRight(teacher,avoid=['conj']))
     from Manchester
 
+    5) the strings are slices of the source text, so the whitespace is kept;
+       the offsets of the slices are there too, without building the strings
+
+    >>> toOffsetsRight(teacher,avoid=['conj'])
+    [(28, 43)]
+    >>> tokens = [doc[7], doc[6]]
+    >>> print(toStr(tokens))
+    Manchester,
+    >>> tokens
+    [,, Manchester]
 
 """
-from spacy.tokens import Token
+import weakref
+
+from spacy.tokens import Token, Doc
+
+from depcy.base.index import tree_index
 
 def toStr(tokens: list[Token]):
-    """Returns a string from a list of tokens"""
-    tokens.sort(key=lambda x: x.i)
-    return " ".join([token.text for token in tokens])
+    """Returns a string from a list of tokens, in sentence order, with the whitespace of the source text"""
+    if not tokens: return ""
+    if isinstance(tokens[0], str): return " ".join(tokens)
+    return offsetsToStr(tokens[0].doc, toOffsets(tokens))
 
 def toStrs(list_of_tokens):
     """Returns a list of strings from a list of tokens"""
-    strings = []
-    for tokens in list_of_tokens:
-        tokens.sort(key=lambda x: x.i)
-        strings.append(" ".join([token.text for token in tokens]))
-    return strings
+    return [toStr(tokens) for tokens in list_of_tokens]
+
+# render tokens as slices of the source text: consecutive tokens are one (start, end) char offset
+
+_texts = weakref.WeakKeyDictionary()
+
+def docText(doc):
+    """The text of a doc (or overlay), joined once"""
+    if not isinstance(doc, Doc): return doc.text # an overlay keeps its text
+    text = _texts.get(doc)
+    if text is None or (len(doc) and doc[-1].idx + len(doc[-1].text_with_ws) != len(text)):
+        text = _texts[doc] = doc.text
+    return text
+
+def offsetsToStr(doc, offsets):
+    """Returns the slices of the text of doc at offsets, joined by a space"""
+    text = docText(doc)
+    return " ".join(text[start:end] for start, end in offsets)
+
+def toOffsets(tokens: list[Token]):
+    """Returns the (start, end) char offsets of the runs of consecutive tokens, in sentence order"""
+    if not tokens: return []
+    return _offsets(tokens[0].doc, _runs(sorted(token.i for token in tokens)))
+
+def _runs(indices):
+    """The (first, last) token indices of the runs of consecutive indices"""
+    runs = []
+    for i in indices:
+        if runs and i == runs[-1][1] + 1:
+            runs[-1][1] = i
+        else:
+            runs.append([i, i])
+    return runs
+
+def _offsets(doc, runs):
+    offsets = []
+    for first, last in runs:
+        last = doc[last]
+        offsets.append((doc[first].idx, last.idx + len(last)))
+    return offsets
+
+def _subtree_offsets(token, avoid, side=None):
+    """The offsets of the descendants of token without the subtrees of avoid, on side "left", "right" or both"""
+    doc = token.doc
+    index = tree_index(doc)
+    i, skip = token.i, frozenset(avoid)
+    if not skip and index.is_contiguous(i):
+        # the subtree fills first..last, with a gap at token
+        runs = [[index.first[i], i - 1], [i + 1, index.last[i]]]
+    else:
+        runs = _runs(index.descendants(i, skip=skip))
+    if side == "left":
+        runs = [run for run in runs if run[1] < i]
+    elif side == "right":
+        runs = [run for run in runs if run[0] > i]
+    return _offsets(doc, [run for run in runs if run[0] <= run[1]])
+
+def toOffsetsSub(token, avoid = []):
+    """Returns the (start, end) char offsets of a tokens subtree, without the token"""
+    if token == None: return []
+    return _subtree_offsets(token, avoid)
+
+def toOffsetsLeft(token, avoid = []):
+    """Returns the (start, end) char offsets of a tokens left subtree"""
+    return _subtree_offsets(token, avoid, "left")
+
+def toOffsetsRight(token, avoid = []):
+    """Returns the (start, end) char offsets of a tokens right subtree"""
+    return _subtree_offsets(token, avoid, "right")
 
 # convert a subtree to a string representation
 def descendants(token, avoid=[]):
@@ -87,32 +166,20 @@ def descendants(token, avoid=[]):
     Get all tokens in a subtree of a token, excluding the token itself and tokens with a dependency in avoid.
     """
     if token == None: return []
-    descs = []
-    for child in token.children:
-        if child.dep_ not in avoid:
-            descs.append(child)
-            descs.extend(descendants(child, avoid))
-    return descs
+    doc = token.doc
+    return [doc[i] for i in tree_index(doc).walk(token.i, skip=frozenset(avoid))[1:]]
 
 def toStrSub(token, avoid = []):
     """Returns a string representation of a tokens subtree"""   
     if token == None: return ""
-    ts = list(descendants(token, avoid)) if token.subtree else []
-    ts.sort(key=lambda x: x.i)
-    return " ".join([item.text for item in ts])
+    return offsetsToStr(token.doc, toOffsetsSub(token, avoid))
 
 def toStrLeft(token, avoid = []):
     """Returns a string representation of a tokens left subtree"""
-    ts = list(descendants(token, avoid)) if token.subtree else []
-    ts.sort(key=lambda x: x.i)
-    ts = [t for t in ts if t.i < token.i]
-    return " ".join([item.text for item in ts])
+    return offsetsToStr(token.doc, toOffsetsLeft(token, avoid))
 def toStrRight(token, avoid = []):
     """Returns a string representation of a tokens right subtree"""
-    ts = list(descendants(token, avoid)) if token.subtree else []
-    ts.sort(key=lambda x: x.i)
-    ts = [t for t in ts if t.i > token.i]
-    return " ".join([item.text for item in ts])
+    return offsetsToStr(token.doc, toOffsetsRight(token, avoid))
 
 
 
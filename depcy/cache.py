@@ -0,0 +1,117 @@
+# Copyright (C) 2023, 2024 Dr. Wolfgang Spahn
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+    This module contains an on-disk cache for filled masks.
+
+    Entries are keyed by model name and the exact prompt string, live in a SQLite
+    file shared across processes, and the least recently used ones are evicted
+    when the cache grows beyond max_entries.
+
+    In python console use it like this:
+    >>> from depcy.cache import MaskCache
+    >>> cache = MaskCache(":memory:", max_entries=2)
+    >>> cache.put_many("distilroberta-base", {"Tom plays and <mask> sleeps.": "Tom plays and he sleeps."})
+    >>> cache.get_many("distilroberta-base", ["Tom plays and <mask> sleeps.", "unknown"])
+    {'Tom plays and <mask> sleeps.': 'Tom plays and he sleeps.'}
+    >>> cache.put_many("distilroberta-base", {"a": "A", "b": "B"})
+    >>> len(cache)
+    2
+
+    With splitIntoSubtrees:
+    > from depcy.split import splitIntoSubtrees
+    > with MaskCache("masks.sqlite") as cache:
+    >     print(splitIntoSubtrees(doc, cache=cache))
+"""
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class MaskCache:
+    """A size bounded SQLite cache of filled masks, keyed by (model, prompt)"""
+
+    def __init__(self, path, max_entries=100_000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        if path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS masks (
+                                model TEXT NOT NULL,
+                                prompt TEXT NOT NULL,
+                                sequence TEXT NOT NULL,
+                                used REAL NOT NULL,
+                                PRIMARY KEY (model, prompt))""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS masks_used ON masks (used)")
+        self._db.commit()
+
+    def get_many(self, model, prompts):
+        """Returns {prompt: sequence} for the prompts found in the cache, marking them as used"""
+        found = {}
+        prompts = list(dict.fromkeys(prompts))
+        with self._lock, self._db:
+            for i in range(0, len(prompts), 500): # stay below sqlite's variable limit
+                chunk = prompts[i:i + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = self._db.execute(f"SELECT prompt, sequence FROM masks WHERE model = ? AND prompt IN ({marks})",
+                                        [model, *chunk]).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._db.executemany("UPDATE masks SET used = ? WHERE model = ? AND prompt = ?",
+                                     [(now, model, prompt) for prompt in found])
+        logger.debug(f"get_many: {len(found)} of {len(prompts)} prompts cached")
+        return found
+
+    def put_many(self, model, sequences):
+        """Stores {prompt: sequence} and evicts the least recently used entries beyond max_entries"""
+        now = time.time()
+        with self._lock, self._db:
+            self._db.executemany("INSERT OR REPLACE INTO masks (model, prompt, sequence, used) VALUES (?, ?, ?, ?)",
+                                 [(model, prompt, sequence, now) for prompt, sequence in sequences.items()])
+            excess = self._count() - self.max_entries
+            if excess > 0:
+                self._db.execute("DELETE FROM masks WHERE rowid IN (SELECT rowid FROM masks ORDER BY used LIMIT ?)",
+                                 (excess,))
+
+    def _count(self):
+        return self._db.execute("SELECT COUNT(*) FROM masks").fetchone()[0]
+
+    def __len__(self):
+        with self._lock:
+            return self._count()
+
+    def clear(self):
+        """Drops all entries"""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM masks")
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
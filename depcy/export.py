@@ -0,0 +1,183 @@
+# Copyright (C) 2023, 2024 Dr. Wolfgang Spahn
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+    This module exports extraction results column by column, as Apache Arrow record batches in Parquet files.
+
+    A ParquetExporter extracts the nouns and SPOs of each sentence (see extract.extract_all) into
+    column buffers, and writes them as one record batch whenever buffer_rows rows are buffered, so
+    memory stays bounded however many sentences are exported. Nouns and SPOs go to two files,
+    <path>/nouns.parquet and <path>/spos.parquet (see NOUN_COLUMNS and SPO_COLUMNS), which can be
+    read back memory-mapped instead of running depcy again. Char offsets are those of the doc.
+    The objects of an SPO need not be contiguous: obj_runs holds their (start, end) runs, and
+    obj_start, obj_end is only the range that bounds them.
+
+    pyarrow is imported on first use: pip install depcy[arrow]
+
+    In python console use it like this:
+    > import spacy
+    > nlp = spacy.load("en_core_web_sm")
+    > with ParquetExporter("results") as exporter:
+    >     for doc_id, doc in enumerate(nlp.pipe(texts)):
+    >         exporter.add_doc(doc_id, doc)
+    > import pyarrow.parquet
+    > pyarrow.parquet.read_table("results/spos.parquet", memory_map=True).to_pandas()
+"""
+import importlib.util
+import logging
+import os
+
+from depcy.base.spo import SPO
+from depcy.base.string import toStr
+from depcy.extract import extract_all, phrasesToStr
+
+logger = logging.getLogger(__name__)
+
+# column: arrow type name (or a function of pyarrow giving the type), of the nouns (and proper nouns) and of the SPOs
+NOUN_COLUMNS = {"doc_id": "string", "sent_id": "int32", "text": "string",
+                "start": "int64", "end": "int64", "dep": "string", "pos": "string"}
+SPO_COLUMNS = {"doc_id": "string", "sent_id": "int32", "subj": "string", "verb": "string", "obj": "string",
+               "phrase": "string", "subj_start": "int64", "subj_end": "int64", "verb_start": "int64",
+               "verb_end": "int64", "obj_start": "int64", "obj_end": "int64",
+               "obj_runs": lambda pa: pa.list_(pa.struct([("start", pa.int64()), ("end", pa.int64())])),
+               "verb_lemma": "string"}
+
+
+def _pyarrow():
+    """Imports the optional pyarrow package on first use of the exporter"""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("exporting to Parquet needs the optional dependency pyarrow: pip install depcy[arrow]") from e
+    return pyarrow
+
+
+class ColumnBuffer:
+    """Rows of one schema buffered column-wise, written as an arrow record batch to a Parquet file when full"""
+
+    def __init__(self, path, columns, buffer_rows, compression):
+        pa = _pyarrow()
+        self.schema = pa.schema([(name, type_(pa) if callable(type_) else getattr(pa, type_)())
+                                 for name, type_ in columns.items()])
+        self.writer = pa.parquet.ParquetWriter(path, self.schema, compression=compression)
+        self.buffer_rows = buffer_rows
+        self.columns = {name: [] for name in columns}
+        self.rows = 0
+        self.written = 0
+
+    def append(self, row):
+        for name, values in self.columns.items():
+            values.append(row.get(name))
+        self.rows += 1
+        if self.rows >= self.buffer_rows:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        pa = _pyarrow()
+        batch = pa.record_batch([pa.array(values, type=field.type)
+                                 for values, field in zip(self.columns.values(), self.schema)], schema=self.schema)
+        self.writer.write_batch(batch)
+        logger.debug(f"flush: {self.rows} rows")
+        self.written += self.rows
+        for values in self.columns.values():
+            values.clear()
+        self.rows = 0
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+class ParquetExporter:
+    """Writes the nouns and SPOs of docs incrementally to <path>/nouns.parquet and <path>/spos.parquet"""
+
+    def __init__(self, path, buffer_rows=65_536, compression="zstd", merge=True, **flags):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.merge = merge
+        self.flags = flags
+        self.nouns = ColumnBuffer(os.path.join(path, "nouns.parquet"), NOUN_COLUMNS, buffer_rows, compression)
+        self.spos = ColumnBuffer(os.path.join(path, "spos.parquet"), SPO_COLUMNS, buffer_rows, compression)
+
+    def add_doc(self, doc_id, doc):
+        """Exports every sentence of doc, numbered from 0"""
+        for sent_id, sent in enumerate(doc.sents):
+            self.add(doc_id, sent_id, sent.as_doc(), offset=sent.start_char)
+
+    def add(self, doc_id, sent_id, doc, offset=0):
+        """Exports a sentence doc, whose text starts at char offset of the doc it was taken from"""
+        result = extract_all(doc, want={"nouns", "spos"}, merge=self.merge, **self.flags)
+        self.add_result(doc_id, sent_id, result, offset=offset)
+
+    def add_result(self, doc_id, sent_id, result, offset=0):
+        """Exports the "nouns" and "spos" of an extract_all result"""
+        doc_id = str(doc_id)
+        for token in result.get("nouns", []):
+            start = token.idx + offset
+            self.nouns.append({"doc_id": doc_id, "sent_id": sent_id, "text": token.text, "start": start,
+                               "end": start + len(token), "dep": token.dep_, "pos": token.pos_})
+        for spo in result.get("spos", []):
+            record = SPO.from_tokens(spo)
+            (subj_start, subj_end), (verb_start, verb_end) = record.subj_offsets, record.verb_offsets
+            runs = record.obj_offsets
+            self.spos.append({"doc_id": doc_id, "sent_id": sent_id, "subj": spo[0].text, "verb": spo[1].text,
+                              "obj": toStr(spo[2]), "phrase": phrasesToStr(spo),
+                              "subj_start": subj_start + offset, "subj_end": subj_end + offset,
+                              "verb_start": verb_start + offset, "verb_end": verb_end + offset,
+                              "obj_start": runs[0][0] + offset if runs else None,
+                              "obj_end": runs[-1][1] + offset if runs else None,
+                              "obj_runs": [{"start": start + offset, "end": end + offset} for start, end in runs],
+                              "verb_lemma": spo[1].lemma_})
+
+    def close(self):
+        """Writes the buffered rows and closes the files"""
+        self.nouns.close()
+        self.spos.close()
+        logger.debug(f"close: {self.nouns.written} nouns, {self.spos.written} spos written to {self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# a round trip, tested only where the optional pyarrow is installed
+__test__ = {"round_trip": """
+    A result written and read back (objects "book" and "letter" without the "and a" between them):
+    >>> import tempfile
+    >>> import pyarrow.parquet
+    >>> import spacy
+    >>> from spacy.tokens import Doc
+    >>> words = "The soldier reads a book and a letter .".split()
+    >>> doc = Doc(spacy.blank("en").vocab, words=words, heads=[1, 2, 2, 4, 2, 4, 7, 4, 2],
+    ...           deps="det nsubj ROOT det dobj cc det conj punct".split(), pos="DET NOUN VERB DET NOUN CCONJ DET NOUN PUNCT".split())
+    >>> with tempfile.TemporaryDirectory() as path:
+    ...     with ParquetExporter(path) as exporter:
+    ...         exporter.add_result("a", 0, {"nouns": [doc[1]], "spos": [[doc[1], doc[2], [doc[4], doc[7]]]]})
+    ...     table = pyarrow.parquet.read_table(f"{path}/spos.parquet")
+    >>> row = table.to_pylist()[0]
+    >>> row["phrase"], row["obj_start"], row["obj_end"]
+    ('soldier reads book letter', 20, 37)
+    >>> row["obj_runs"]
+    [{'start': 20, 'end': 24}, {'start': 31, 'end': 37}]
+"""} if importlib.util.find_spec("pyarrow") else {}
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -153,6 +153,27 @@
      [a period of global transition of human economy, starting, [from, Great Britain, and, continental Europe, and, the United States]],
      [that, occurred, [during, the period, from, around, 1760, to, about, 1820–1840]]]
 
+    or one by one, stopping when we have enough
+
+    >>> list(iter_spos(doc2, limit=1))
+    [[a period of global transition of human economy, known, [as, the First Industrial Revolution]]]
+
+    or as compact records of token indices and char offsets, which do not keep the doc alive
+
+    >>> records = get_SPO_records(doc2, strings=True)
+    >>> records[2], phrasesToStr(records[2])
+    (SPO(11, 12, (13,)), 'that succeeded the Agricultural Revolution')
+
+    a record without strings needs the doc it was found on for its text
+
+    >>> record = get_SPO_records(doc2)[2]
+    >>> phrasesToStr(record, doc=doc2)
+    'that succeeded the Agricultural Revolution'
+    >>> phrasesToStr(record)
+    Traceback (most recent call last):
+    ...
+    ValueError: SPO.text: a record without strings needs the doc (or its text)
+
      3) we get noun phrases
 
     >>> print(sents[1])
@@ -185,7 +206,25 @@
     >>> pprint([phrasesToStr(p) for p in get_phrases(doc5)], width=200)
     ['The textile industry was the first', 'first use modern production methods', 'textiles became the dominant industry in terms of employment', 'capital invested ']
 
-    6) get phrases from physics text
+    The phrases are found on a merged view (see merge_view), doc5 itself keeps its tokens:
+    >>> len(doc5) == len(sents[3])
+    True
+
+    6) compare merge settings on one parse (configs sharing their first passes share the merge work)
+
+    >>> variants = merge_variants(sents[0].as_doc(), [dict(prep=False, phrase=False, appos=False), {}])
+    >>> print(variants[0]["nouns_propns"])
+    [Industrial Revolution, First, Industrial Revolution, period, transition, economy, manufacturing processes, Agricultural Revolution, Great Britain, continental Europe, United States, period]
+    >>> [t.text for t in variants[1]["nouns_propns"]] == [t.text for t in nouns_propns(merge_view(sents[0].as_doc()))]
+    True
+
+    7) or everything at once: extract_all merges a view once and walks its tree once
+
+    >>> pprint(extract_all(sents[2].as_doc(), want={"nouns", "strings"}), width=200)
+    {'nouns': [Output, the result, an unprecedented rise, population, the rate of population growth],
+     'strings': ['Output increased ', 'the result was an unprecedented rise in population and the rate of population growth']}
+
+    8) get phrases from physics text
     >>> text = "Momentum is conserved in this system because there are no external forces acting on it. The system is isolated, and the only forces at play are the internal forces between the two carts during the collision. According to the law of conservation of momentum, the total momentum of an isolated system remains constant. The total momentum before the collision, here just the momentum of cart 1, must equal the total momentum after the collision."
     >>> doc = nlp(text)
     >>> phs = []
@@ -204,12 +243,18 @@
      'The total momentum must equal the total momentum after the collision']
 
 """
+import itertools
 import logging
 import spacy
 from spacy.tokens import Token, Doc, Span
 
+from depcy.base.index import tree_index
 from depcy.base.navigate import descendants, descendants_and_self
-from depcy.base.merge import merge_all, merge_verbs
+from depcy.base.merge import merge_all, merge_verbs, merge_view
+from depcy.base.overlay import Overlay
+from depcy.base.plan import DEFAULTS, PASSES, passes
+from depcy.base.select import first, iter_tokens, select, select_tokens
+from depcy.base.spo import SPO
 from depcy.base.string import toStr
 
 
@@ -219,44 +264,44 @@ logger = logging.getLogger(__name__)
 
 def root(tokens):
     """Returns the first root token, in tokens, or None"""
-    logger.debug(f"root: {tokens}")
-    return next((token for token in tokens if token.dep_ == "ROOT"), None)
+    logger.debug("root: %s", tokens)
+    return first(tokens, dep=["ROOT"])
 def subj(tokens):
     """Returns the first subject of a sentence, or None"""
-    logger.debug(f"subj: {tokens}")
-    return next((token for token in tokens if token.dep_ in ["nsubj","nsubjpass","expl"]), None)
+    logger.debug("subj: %s", tokens)
+    return first(tokens, dep=["nsubj","nsubjpass","expl"])
 def obj(tokens):
     """Returns the first  object of a sentence"""
-    logger.debug(f"obj: {tokens}")
-    return next((token for token in tokens if token.dep_ in ["dobj","attr"]), None)
+    logger.debug("obj: %s", tokens)
+    return first(tokens, dep=["dobj","attr"])
 def attr(tokens):
     """Returns the first attribute of a sentence"""
-    logger.debug(f"attr: {tokens}")
-    return next((token for token in tokens if token.dep_ == "attr"), None)
+    logger.debug("attr: %s", tokens)
+    return first(tokens, dep=["attr"])
 def prep(tokens):
     """Returns the preposition of a sentence"""
-    logger.debug(f"getPrep: {tokens}")
-    return next((token for token in tokens if token.dep_ == "prep"), None)
+    logger.debug("getPrep: %s", tokens)
+    return first(tokens, dep=["prep"])
 def aux(tokens):
     """Returns aux"""
-    return next((token for token in tokens if token.dep_ == "auxpass"), None)
+    return first(tokens, dep=["auxpass"])
 
 # get lists of tokens
 
 def preps(tokens):
     """Returns a list of prepositions in a sentence"""
-    logger.debug(f"preps: {tokens}")
-    return [token for token in tokens if token.dep_ == "prep"]
+    logger.debug("preps: %s", tokens)
+    return select_tokens(tokens, dep=["prep"])
 
 def verbs(tokens):
     """Returns a list of verbs in a sentence"""
-    logger.debug(f"verbs: {tokens}")
-    return [token for token in tokens if token.pos_ in ["VERB","AUX"]]
+    logger.debug("verbs: %s", tokens)
+    return select_tokens(tokens, pos=["VERB","AUX"])
 
 def nouns_propns(tokens):
     """Returns a list of nouns and proper nouns in a sentence"""
-    logger.debug(f"nouns_propn: {tokens}")
-    return [token for token in tokens if token.pos_ in ["NOUN","PROPN"]]
+    logger.debug("nouns_propn: %s", tokens)
+    return select_tokens(tokens, pos=["NOUN","PROPN"])
 
 
 
@@ -267,8 +312,9 @@ def preps_descendants(token, skip=[]):
     """Returns a list of prepositions and their descendants in a sentence"""
     logger.debug(f"prep_descendants: {token}")
     if token == None: return []
-    ps = preps(token.children)
-    results = sum([descendants_and_self(p,skip) for p in ps],[])
+    results = []
+    for p in preps(token.children):
+        results.extend(descendants_and_self(p,skip))
     results.sort(key=lambda x: x.i)
     return results
 def obj_descendants(token, skip=[]):
@@ -286,35 +332,135 @@ def obj_descendants(token, skip=[]):
 def get_SPOs(tokens):
     """
         Returns a list of subject-predicate-object triples in a sentence.
+        A verb without a subject of its own takes the one of the nearest verb above it (see inherited_subjects),
+        a verb without any is left out.
         TODO: Compare and eventually merge with splitIntoSubtrees
     """
-    logger.debug(f"get_SPOs: {tokens}")
-    
-    spos = []
-    for verb_ in verbs(tokens):
-        subj_ = subj(verb_.children)
-        if subj_ == None: subj_ = verb_subj_ancestors(verb_)[-1]
-        preps_ = preps_descendants(verb_,skip=["relcl","acl","appos","punct"])
-        obj_ = obj_descendants(verb_,skip=["relcl","acl","appos","punct"])
-        spos.append([subj_, verb_,  obj_ + preps_])
-    return spos
+    logger.debug("get_SPOs: %s", tokens)
+    return list(iter_spos(tokens))
+
+def iter_spos(tokens, limit=None):
+    """Yields the subject-predicate-object triples of get_SPOs as they are found, at most limit (None: all)"""
+    verbs_ = iter_tokens(tokens, pos=["VERB","AUX"])
+    first_verb = next(verbs_, None)
+    if first_verb is None: return
+    doc = first_verb.doc
+    indices = itertools.chain([first_verb.i], (verb.i for verb in verbs_))
+    spos = ([doc[s], doc[v], [doc[i] for i in o]] for s, v, o in _spos(doc, indices))
+    yield from itertools.islice(spos, limit)
+
+def get_SPO_records(tokens, strings=False):
+    """Returns the triples of get_SPOs as SPO records (token indices and char offsets, interned strings if strings)"""
+    return list(iter_SPO_records(tokens, strings=strings))
+
+def iter_SPO_records(tokens, limit=None, strings=False):
+    """Yields the triples of get_SPOs as SPO records as they are found, at most limit (None: all)"""
+    yield from (SPO.from_tokens(spo, strings=strings) for spo in iter_spos(tokens, limit=limit))
+
+def iter_nouns(tokens, limit=None):
+    """Yields the nouns and proper nouns of nouns_propns one by one, at most limit (None: all)"""
+    yield from itertools.islice(iter_tokens(tokens, pos=["NOUN","PROPN"]), limit)
+
+SPO_SKIP = frozenset(["relcl","acl","appos","punct"])
+
+def _spos(doc, verbs_):
+    """The (subject, verb, objects) indices of get_SPOs for the verb indices verbs_, on the tree index of doc"""
+    index = tree_index(doc)
+    deps, children = index.deps, index.children
+    subjects = None
+    for v in verbs_:
+        s = next((c for c in children[v] if deps[c] in ("nsubj","nsubjpass","expl")), None)
+        if s is None:
+            # the subject of the nearest verb up the tree, resolved for all tokens at once
+            if subjects is None: subjects = _inherited_subjects(doc, index)
+            s = subjects[v]
+        if s < 0:
+            logger.debug("get_SPOs: no subject for %s", doc[v])
+            continue
+        o = next((c for c in children[v] if deps[c] in ("dobj","attr")), None)
+        objs = sorted(index.descendants(o, SPO_SKIP) + [o]) if o is not None else []
+        preps_ = []
+        for p in children[v]:
+            if deps[p] == "prep":
+                preps_.append(p)
+                preps_.extend(index.descendants(p, SPO_SKIP))
+        preps_.sort()
+        yield s, v, objs + preps_
+
+def extract_all(doc, want=("nouns", "spos", "strings"), merge=True, **flags):
+    """
+        Returns the outputs in want of doc as a dict: "nouns" (as nouns_propns), "spos" (as get_SPOs)
+        and "strings" (as phrasesToStr of the spos). doc is merged once, as a view (see merge_view,
+        flags are those of merge_all; merge=False takes doc as it is), and its tree is walked once.
+    """
+    assert isinstance(doc, (Doc, Overlay))
+    want = set(want)
+    unknown = want - {"nouns", "spos", "strings"}
+    if unknown:
+        raise ValueError(f"extract_all: unknown outputs {sorted(unknown)}")
+    view = merge_view(doc, **flags) if merge else doc
+    result = {}
+    if "nouns" in want:
+        result["nouns"] = select_tokens(view, pos=["NOUN","PROPN"])
+    if "spos" in want or "strings" in want:
+        spos = [[view[s], view[v], [view[i] for i in o]]
+                for s, v, o in _spos(view, select(view, pos=["VERB","AUX"]).tolist())]
+        if "spos" in want:
+            result["spos"] = spos
+        if "strings" in want:
+            result["strings"] = [phrasesToStr(spo) for spo in spos]
+    return result
 
 def get_phrases(doc):
-    """Returns a list of phrases in a sentence"""
-    assert isinstance(doc, Doc)
-    doc = merge_all(doc)
-    return get_SPOs(doc)
+    """Returns a list of phrases in a sentence, found on a merged view (doc is not merged itself)"""
+    assert isinstance(doc, (Doc, Overlay))
+    return get_SPOs(merge_view(doc))
 
 def get_phrases_str(doc):
-    """Returns a list of phrases in a sentence"""
-    assert isinstance(doc, Doc)
-    doc = merge_all(doc)
-    return [phrasesToStr(p) for p in get_SPOs(doc)]
+    """Returns a list of phrases in a sentence, found on a merged view (doc is not merged itself)"""
+    assert isinstance(doc, (Doc, Overlay))
+    return list(iter_phrases_str(doc))
+
+def iter_phrases_str(doc, limit=None):
+    """Yields the phrases of get_phrases_str as they are found, at most limit (None: all)"""
+    assert isinstance(doc, (Doc, Overlay))
+    yield from (phrasesToStr(p) for p in iter_spos(merge_view(doc), limit=limit))
+
+def merge_variants(doc, configs=None):
+    """
+        Returns the nouns_propns and get_SPOs of doc merged by merge_all with each of configs
+        (dicts of merge_all flags, default: all 64 combinations), as a list of dicts in the order of configs.
+        doc is parsed once and left alone: the variants are merged views, and configs sharing their
+        first passes share that merge work (a trie of pass sequences).
+    """
+    assert isinstance(doc, (Doc, Overlay))
+    if configs is None:
+        configs = [dict(zip(DEFAULTS, flags)) for flags in itertools.product([True, False], repeat=len(DEFAULTS))]
+    configs = list(configs)
+    # trie of pass sequences: node = (configs ending here, {pass: child node})
+    trie = ([], {})
+    for i, config in enumerate(configs):
+        node = trie
+        for step in passes(**config):
+            node = node[1].setdefault(step, ([], {}))
+        node[0].append(i)
+    results = [None] * len(configs)
+    stack = [(trie, doc.copy() if isinstance(doc, Overlay) else Overlay(doc))]
+    while stack:
+        (ending, children), overlay = stack.pop()
+        for i in ending:
+            results[i] = {"config": configs[i], "nouns_propns": nouns_propns(overlay), "spos": get_SPOs(overlay)}
+        for step, child in children.items():
+            view = overlay.copy()
+            view.merge(PASSES[step][1](view))
+            stack.append((child, view))
+    return results
 
 # convert a list of tokens to a string
 
-def phrasesToStr(spo):
-    """Returns a string from a spo tuple"""
+def phrasesToStr(spo, doc=None):
+    """Returns a string from a spo tuple, or from an SPO record (sliced from the text of doc, which a record without strings needs)"""
+    if isinstance(spo, SPO): return spo.text(doc=doc)
     s = spo[0].text
     p = spo[1].text
     o = toStr(spo[2])
@@ -325,9 +471,12 @@ def phrasesToStr(spo):
 def verb_descendants(tokens, skip=[]):
     """Returns a list of verbs and their descendants in a sentence"""
     logger.debug(f"verb_descendants: {tokens}")
-    results = [[token]+descendants(token,skip) for token in tokens if token.pos_ in ["VERB"]]
-    for r in results: r.sort(key=lambda x: x.i)
-    return results
+    return list(iter_verb_descendants(tokens, skip=skip))
+
+def iter_verb_descendants(tokens, skip=[], limit=None):
+    """Yields the verbs of verb_descendants with their descendants one by one, at most limit (None: all)"""
+    verbs_ = iter_tokens(tokens, pos=["VERB"])
+    yield from itertools.islice((descendants_and_self(verb, skip) for verb in verbs_), limit)
 
 
 def ancestors(token):
@@ -354,6 +503,37 @@ def verb_subj_ancestors(token):
         subjs.extend([t for t in t.children if t.dep_ in ["nsubj","nsubjpass","attr"]])
     return subjs
 
+def inherited_subjects(doc):
+    """
+        For every token of doc, the subject verb_subj_ancestors(token)[-1] gives, or None if there is none:
+        the last nsubj, nsubjpass or attr child of the nearest verb up to the root, the token included.
+        One pass over the tree, each token resolved once from its head.
+    """
+    return [doc[s] if s >= 0 else None for s in _inherited_subjects(doc, tree_index(doc))]
+
+def _inherited_subjects(doc, index):
+    """The index of the subject of every token as by inherited_subjects, -1 for none"""
+    parent, deps, children = index.parent, index.deps, index.children
+    own = {}
+    for v in select(doc, pos=["VERB","AUX"]).tolist():
+        subjects = [c for c in children[v] if deps[c] in ("nsubj","nsubjpass","attr")]
+        if subjects: own[v] = subjects[-1]
+    unknown = -2
+    inherited = [unknown] * len(parent)
+    for i in range(len(parent)):
+        path, j = [], i
+        while inherited[j] == unknown:
+            if j in own:
+                inherited[j] = own[j]
+            elif deps[j] == "ROOT" or parent[j] == j or len(path) > len(parent):
+                inherited[j] = -1
+            else:
+                path.append(j)
+                j = parent[j]
+        for k in path:
+            inherited[k] = inherited[j]
+    return inherited
+
 if __name__ == "__main__":
     import doctest
     doctest.testmod()
\ No newline at end of file
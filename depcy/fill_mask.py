@@ -0,0 +1,170 @@
+# Copyright (C) 2023, 2024 Dr. Wolfgang Spahn
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+    This module contains the backends that fill the <mask> in split.fillPhrase(s).
+
+    A mask filler takes a list of prompts and returns the top-1 sequence for each,
+    i.e. the prompt with its first <mask> replaced by the most likely token:
+
+    - PipelineMaskFiller: the hugging face fill-mask pipeline (default, full precision)
+    - QuantizedMaskFiller: a local model, dynamically quantized to int8 with pytorch
+    - OnnxMaskFiller: a local (quantized) ONNX export, run with onnxruntime
+
+    The heavy dependencies (transformers, torch, onnxruntime) are imported on first use.
+
+    In python console use it like this:
+    > from depcy.fill_mask import QuantizedMaskFiller
+    > from depcy.split import splitIntoSubtrees
+    > filler = QuantizedMaskFiller("models/distilroberta-base")
+    > filler(["Tom plays tennis and <mask> plays socker."])
+    ['Tom plays tennis and he plays socker.']
+    > print(splitIntoSubtrees(doc, model=filler))
+
+    For the ONNX backend, export the model (e.g. `optimum-cli export onnx --task fill-mask
+    --model distilroberta-base models/distilroberta-onnx`) and quantize it once:
+    > quantize_onnx("models/distilroberta-onnx")
+    > filler = OnnxMaskFiller("models/distilroberta-onnx", file="model_int8.onnx")
+"""
+import abc
+import functools
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+FILL_MASK_MODEL = "distilroberta-base"
+
+
+def _transformers():
+    """Imports the optional transformers package (and so torch) on first use of the fill-mask path"""
+    try:
+        import transformers
+    except ImportError as e:
+        raise ImportError("filling <mask> needs the optional dependencies transformers and torch: "
+                          "pip install depcy[fill-mask], or use fill_mask=False") from e
+    transformers.logging.set_verbosity_error()
+    return transformers
+
+
+class MaskFiller(abc.ABC):
+    """Fills the first <mask> of each prompt with the most likely token"""
+
+    # the name keys cached results, so different backends never share entries
+    name = None
+
+    @abc.abstractmethod
+    def __call__(self, prompts, batch_size=32):
+        """Returns the top-1 sequence of each prompt"""
+
+
+class PipelineMaskFiller(MaskFiller):
+    """The hugging face fill-mask pipeline of model (a hub name or a local path)"""
+
+    def __init__(self, model=FILL_MASK_MODEL):
+        self.name = model
+        logger.debug(f"PipelineMaskFiller: loading {model}")
+        self.pipeline = _transformers().pipeline("fill-mask", model=model)
+
+    def __call__(self, prompts, batch_size=32):
+        if not prompts: return []
+        results = self.pipeline(list(prompts), top_k=1, batch_size=batch_size)
+        if len(prompts) == 1: results = [results] # the pipeline unwraps a single input
+        sequences = []
+        for result in results:
+            top = result[0]
+            if isinstance(top, list): top = top[0] # more than one <mask>: we take the first
+            sequences.append(top['sequence'])
+        return sequences
+
+
+class _LocalMaskFiller(MaskFiller):
+    """Top-1 decoding shared by the backends that run a local model themselves"""
+
+    def __init__(self, path):
+        self.path = path
+        self.tokenizer = _transformers().AutoTokenizer.from_pretrained(path, local_files_only=True)
+
+    @abc.abstractmethod
+    def _logits(self, encoding):
+        """Returns the logits (batch, tokens, vocabulary) as numpy array for a numpy encoding"""
+
+    def __call__(self, prompts, batch_size=32):
+        sequences = []
+        mask_id = self.tokenizer.mask_token_id
+        for i in range(0, len(prompts), batch_size):
+            encoding = self.tokenizer(list(prompts[i:i + batch_size]), padding=True, return_tensors="np")
+            logits = self._logits(encoding)
+            for row, ids in enumerate(encoding["input_ids"]):
+                ids = ids.copy()
+                masks = (ids == mask_id).nonzero()[0]
+                if len(masks):
+                    ids[masks[0]] = logits[row, masks[0]].argmax()
+                ids = ids[ids != self.tokenizer.pad_token_id]
+                sequences.append(self.tokenizer.decode(ids, skip_special_tokens=len(masks) <= 1))
+        return sequences
+
+
+class QuantizedMaskFiller(_LocalMaskFiller):
+    """A local masked language model, dynamically quantized to int8 (Linear layers) for the CPU"""
+
+    def __init__(self, path):
+        super().__init__(path)
+        import torch
+        from torch.ao.quantization import quantize_dynamic
+        self.name = f"{os.path.basename(os.path.normpath(path))}+torch-int8"
+        model = _transformers().AutoModelForMaskedLM.from_pretrained(path, local_files_only=True)
+        model.eval()
+        self.model = quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    def _logits(self, encoding):
+        import torch
+        with torch.inference_mode():
+            inputs = {k: torch.from_numpy(v) for k, v in encoding.items()}
+            return self.model(**inputs).logits.numpy()
+
+
+class OnnxMaskFiller(_LocalMaskFiller):
+    """A local ONNX export of a masked language model (e.g. quantized by quantize_onnx), run with onnxruntime"""
+
+    def __init__(self, path, file="model.onnx", threads=None):
+        super().__init__(path)
+        import onnxruntime
+        self.name = f"{os.path.basename(os.path.normpath(path))}+onnx:{file}"
+        options = onnxruntime.SessionOptions()
+        if threads: options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(os.path.join(path, file), options,
+                                                    providers=["CPUExecutionProvider"])
+        self.inputs = [i.name for i in self.session.get_inputs()]
+
+    def _logits(self, encoding):
+        return self.session.run(None, {k: encoding[k] for k in self.inputs})[0]
+
+
+def quantize_onnx(path, file="model.onnx", quantized="model_int8.onnx"):
+    """Dynamically quantizes the ONNX model path/file to int8 weights, written to path/quantized"""
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    target = os.path.join(path, quantized)
+    quantize_dynamic(os.path.join(path, file), target, weight_type=QuantType.QInt8)
+    return target
+
+
+@functools.lru_cache(maxsize=None)
+def fill_mask_pipeline(model=FILL_MASK_MODEL):
+    """Returns the fill-mask pipeline backend of model, built on first use and reused afterwards"""
+    return PipelineMaskFiller(model)
+
+def mask_filler(model=FILL_MASK_MODEL):
+    """Returns the mask filler for model: a MaskFiller is used as is, a name or path gets the shared pipeline backend"""
+    return model if isinstance(model, MaskFiller) else fill_mask_pipeline(model)
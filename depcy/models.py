@@ -0,0 +1,84 @@
+# Copyright (C) 2023, 2024 Dr. Wolfgang Spahn
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+    This module keeps one registry of loaded spacy models for all of depcy.
+
+    A model is loaded lazily on first use and then shared: there is one instance
+    per (model name, disabled components). Callers with their own pipeline can
+    register it, and every function that needs a model also takes an `nlp` argument.
+
+    In python console use it like this:
+    >>> from depcy.models import get_nlp, set_nlp, clear_nlp
+    >>> nlp = get_nlp()                      # loads en_core_web_sm on first use
+    >>> get_nlp() is nlp                     # ... and shares it afterwards
+    True
+    >>> get_nlp(disable=["ner"]) is nlp      # other disabled components, other instance
+    False
+
+    Register your own pipeline, e.g. a blank one for tokenizing only:
+    >>> import spacy
+    >>> blank = set_nlp(spacy.blank("en"), name="blank")
+    >>> get_nlp("blank") is blank
+    True
+    >>> clear_nlp()
+"""
+import logging
+import threading
+
+import spacy
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "en_core_web_sm"
+
+_models = {}
+_lock = threading.Lock()
+
+
+def _key(name, disable):
+    return (name, tuple(sorted(disable)))
+
+def get_nlp(name=DEFAULT_MODEL, disable=()):
+    """Returns the shared spacy model `name` with the components in `disable` disabled, loading it on first use"""
+    key = _key(name, disable)
+    nlp = _models.get(key)
+    if nlp is None:
+        with _lock:
+            nlp = _models.get(key)
+            if nlp is None:
+                logger.debug(f"get_nlp: loading {key}")
+                nlp = spacy.load(name, disable=list(disable))
+                _models[key] = nlp
+    return nlp
+
+def set_nlp(nlp, name=DEFAULT_MODEL, disable=()):
+    """Registers a caller's own model under `name`, so depcy uses it instead of loading one"""
+    with _lock:
+        _models[_key(name, disable)] = nlp
+    return nlp
+
+def resolve_nlp(nlp=None):
+    """Returns `nlp` if given, else the shared default model"""
+    return nlp if nlp is not None else get_nlp()
+
+def clear_nlp():
+    """Drops all registered models"""
+    with _lock:
+        _models.clear()
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,121 @@
+# Copyright (C) 2023, 2024 Dr. Wolfgang Spahn
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+    This module streams a corpus through a spacy model and depcy, sentence by sentence.
+
+    stream parses texts in batches with nlp.pipe (batch_size, n_process) and extracts each sentence
+    as extract.extract_all does: a merged view of sent.as_doc() (flags are those of merge_all),
+    and the outputs in want, plus any extractors (functions of the merged view). It is a generator
+    over a lazy iterable of texts: only the current batch is held, so a corpus larger than memory
+    can be streamed from a file. The results come in the order of the texts, one per text:
+    (id, [result of each sentence]).
+
+    By default (compact=True) the results keep no doc alive: nouns are texts and spos are
+    SPO records with their strings (see depcy.base.spo), with char offsets in the sentence,
+    which starts at result["start"] of the text.
+
+    In python console use it like this:
+    >>> import spacy
+    >>> nlp = spacy.load("en_core_web_sm")
+    >>> texts = ["The soldier reads a book. He sleeps.", "The teacher drinks wine."]
+
+    >>> for id_, sents in stream(texts, nlp=nlp, want=["strings"]):
+    ...     print(id_, [(sent["start"], sent["strings"]) for sent in sents])
+    0 [(0, ['The soldier reads a book']), (26, ['He sleeps '])]
+    1 [(0, ['The teacher drinks wine'])]
+
+    Texts with ids, and an extractor of your own:
+    >>> from depcy.extract import verbs
+    >>> for id_, sents in stream([("a", "The soldier reads a book.")], nlp=nlp, want=["spos"], extractors={"verbs": verbs}):
+    ...     print(id_, sents)
+    a [{'spos': [SPO(0, 1, (2,))], 'verbs': ['reads'], 'start': 0}]
+
+    A corpus file, one text per line:
+    > with open("corpus.txt") as lines:
+    >     for id_, sents in stream((line.rstrip("\\n") for line in lines), batch_size=256, n_process=4):
+    >         ...
+"""
+import itertools
+import logging
+
+from spacy.tokens import Token
+
+from depcy.base.merge import merge_view
+from depcy.base.overlay import OverlayToken
+from depcy.base.spo import SPO
+from depcy.extract import extract_all
+from depcy.models import resolve_nlp
+
+logger = logging.getLogger(__name__)
+
+_END = object()
+
+
+def stream(texts, nlp=None, batch_size=64, n_process=1, want=("nouns", "spos", "strings"), extractors=None,
+           merge=True, compact=True, **flags):
+    """
+        Yields (id, [result of each sentence]) for each of texts, in order: texts are strings (their id
+        is their position) or (id, text) tuples. nlp is the model (None: the shared default model),
+        batch_size and n_process are passed to nlp.pipe. A sentence result is a dict of the outputs in
+        want (see extract_all) and of extractors (a dict name: function of the merged view), and "start".
+    """
+    nlp = resolve_nlp(nlp)
+    pairs = ((text, id_) for id_, text in items(texts))
+    for doc, id_ in nlp.pipe(pairs, as_tuples=True, batch_size=batch_size, n_process=n_process):
+        yield id_, extract_doc(doc, want=want, extractors=extractors, merge=merge, compact=compact, **flags)
+
+def items(texts):
+    """The (id, text) pairs of texts: strings, numbered from 0, or (id, text) tuples"""
+    texts = iter(texts)
+    head = next(texts, _END)
+    if head is _END:
+        return iter(())
+    texts = itertools.chain([head], texts)
+    return texts if isinstance(head, tuple) else enumerate(texts)
+
+def extract_doc(doc, want=("nouns", "spos", "strings"), extractors=None, merge=True, compact=True, **flags):
+    """The results of the sentences of a parsed doc for stream"""
+    return [extract_sent(sent, want=want, extractors=extractors, merge=merge, compact=compact, **flags)
+            for sent in doc.sents]
+
+def extract_sent(sent, want=("nouns", "spos", "strings"), extractors=None, merge=True, compact=True, **flags):
+    """The result of a sentence (a span of a parsed doc) for stream"""
+    doc = sent.as_doc()
+    view = merge_view(doc, **flags) if merge else doc
+    result = extract_all(view, want=want, merge=False)
+    for name, extractor in (extractors or {}).items():
+        result[name] = extractor(view)
+    if compact:
+        result = {name: _compact(name, value) for name, value in result.items()}
+    result["start"] = sent.start_char
+    return result
+
+def _compact(name, value):
+    """An output without tokens: spos as SPO records with strings, tokens as their texts"""
+    if name == "spos":
+        return [SPO.from_tokens(spo, strings=True) for spo in value]
+    return _texts(value)
+
+def _texts(value):
+    if isinstance(value, (Token, OverlayToken)):
+        return value.text
+    if isinstance(value, (list, tuple)):
+        return [_texts(v) for v in value]
+    return value
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
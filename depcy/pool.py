@@ -0,0 +1,218 @@
+# Copyright (C) 2023, 2024 Dr. Wolfgang Spahn
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+    This module parses, merges and extracts a corpus on a pool of worker processes.
+
+    An ExtractPool shards the texts into chunks of chunk_size texts. Each worker loads its own
+    model (by name, see depcy.models) once, and runs a chunk as pipeline.stream does: parse, merge
+    a view of each sentence, extract. Only the compact results go back to the parent, and with
+    docs=True the parsed docs as DocBin bytes, never pickled Docs. map yields in the order of the
+    texts, and keeps at most prefetch chunks per worker in flight, so memory stays bounded.
+
+    With preload=True the parent loads the model (and the fill-mask model fill_mask, see
+    depcy.fill_mask) itself, freezes its objects out of the garbage collector (gc.freeze) and forks
+    all workers at once. The workers find the models loaded: their weights stay shared copy-on-write,
+    as the collection in a worker does not touch the frozen objects. worker_memory reports the
+    unique RSS of each worker, the memory it costs on its own (Linux only). The objects stay frozen
+    until the last open preloading pool is closed.
+
+    Small chunks balance the load, large ones cost less transport and let nlp.pipe batch:
+    python -m benchmarks.pool times chunk sizes and worker counts on your machine.
+    Extractors are sent to the workers, so they must be functions defined at module level.
+
+    In python console use it like this:
+    > texts = ["The soldier reads a book. He sleeps.", "The teacher drinks wine."] * 1000
+    > with ExtractPool(processes=4, chunk_size=64, want=["strings"]) as pool:
+    >     for id_, sents in pool.map(texts):
+    >         ...
+    >     for id_, sents, doc in pool.map(texts[:10], docs=True):
+    >         ...
+
+    The docs come back on a vocab of the language of the model, ready for depcy:
+    >>> from depcy.base.merge import merge_all
+    >>> with ExtractPool(processes=2, want=["strings"]) as pool:
+    ...     for id_, sents, doc in pool.map(["The soldier reads a book."], docs=True):
+    ...         print(id_, sents[0]["strings"], [token.text for token in merge_all(doc)])
+    0 ['The soldier reads a book'] ['The soldier', 'reads', 'a book', '.']
+
+    Warm workers sharing the model of the parent:
+    > with ExtractPool(processes=16, preload=True) as pool:
+    >     results = list(pool.map(texts))
+    >     pool.worker_memory()
+    {4711: (254214144, 31457280), ...}
+"""
+import collections
+import concurrent.futures
+import gc
+import itertools
+import logging
+import multiprocessing
+import os
+
+import spacy
+from spacy.tokens import DocBin
+
+from depcy.models import DEFAULT_MODEL, get_nlp
+from depcy.pipeline import extract_doc, items
+
+logger = logging.getLogger(__name__)
+
+# the model of a worker process
+_worker = {}
+# the open preloading pools: the last one to close unfreezes
+_frozen = 0
+
+
+def _init_worker(model, disable, pids):
+    # a preloaded model was forked with the registry of the parent: nothing to load
+    _worker["nlp"] = get_nlp(model, disable=disable)
+    pids.put(os.getpid())
+    logger.debug(f"_init_worker: {os.getpid()} has {model}")
+
+def _run_chunk(chunk, options, docs):
+    """The (id, sentence results) of a chunk of (id, text) pairs, and the language and the parsed docs as DocBin bytes if docs"""
+    nlp = _worker["nlp"]
+    results = []
+    doc_bin = DocBin(store_user_data=False) if docs else None
+    for doc, id_ in nlp.pipe(((text, id_) for id_, text in chunk), as_tuples=True, batch_size=len(chunk)):
+        results.append((id_, extract_doc(doc, **options)))
+        if docs:
+            doc_bin.add(doc)
+    return results, (nlp.lang, doc_bin.to_bytes()) if docs else None
+
+def process_memory(pid):
+    """The RSS and the unique RSS (its private pages) of process pid in bytes, or None without /proc/<pid>/smaps_rollup"""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+    kb = {}
+    for line in lines:
+        key, _, value = line.partition(":")
+        if value.strip().endswith("kB"):
+            kb[key] = int(value.split()[0])
+    return kb["Rss"] * 1024, (kb["Private_Clean"] + kb["Private_Dirty"]) * 1024
+
+def _chunks(pairs, size):
+    pairs = iter(pairs)
+    chunk = list(itertools.islice(pairs, size))
+    while chunk:
+        yield chunk
+        chunk = list(itertools.islice(pairs, size))
+
+
+class ExtractPool:
+    """A pool of worker processes, each with its own model, that parse, merge and extract chunks of texts"""
+
+    def __init__(self, processes=None, model=DEFAULT_MODEL, disable=(), chunk_size=64, prefetch=2,
+                 want=("nouns", "spos", "strings"), extractors=None, merge=True, mp_context=None,
+                 preload=False, fill_mask=None, **flags):
+        self.processes = processes or os.cpu_count() or 1
+        self.model = model
+        self.chunk_size = chunk_size
+        self.prefetch = prefetch
+        self.preload = preload
+        self.disable = tuple(disable)
+        self._docs_vocab = None
+        self._frozen = False
+        self.options = dict(want=want, extractors=extractors, merge=merge, compact=True, **flags)
+        if preload:
+            if mp_context not in (None, "fork"):
+                raise ValueError(f"ExtractPool: preload forks the workers, not mp_context={mp_context!r}")
+            mp_context = "fork"
+            self._preload(model, tuple(disable), fill_mask)
+        context = multiprocessing.get_context(mp_context)
+        # each worker reports its pid once it is started
+        self._pids = context.SimpleQueue()
+        self._workers = set()
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.processes, mp_context=context, initializer=_init_worker,
+            initargs=(model, tuple(disable), self._pids))
+        if preload:
+            # a forking executor starts all its workers with the first task
+            self._executor.submit(os.getpid).result()
+            logger.debug(f"ExtractPool: forked {self.processes} workers")
+
+    def _preload(self, model, disable, fill_mask):
+        """Loads the models in this process and freezes all objects, before the workers are forked"""
+        global _frozen
+        get_nlp(model, disable=disable)
+        if fill_mask is not None:
+            from depcy.fill_mask import fill_mask_pipeline
+            fill_mask_pipeline(fill_mask)
+        gc.collect()
+        gc.freeze()
+        _frozen += 1
+        self._frozen = True
+
+    def map(self, texts, docs=False, chunk_size=None):
+        """
+            Yields (id, [result of each sentence]) for each of texts in order, as pipeline.stream, and
+            (id, [results], doc) if docs. texts are strings (numbered from 0) or (id, text) tuples.
+        """
+        chunks = _chunks(items(texts), chunk_size or self.chunk_size)
+        pending = collections.deque()
+        try:
+            for chunk in itertools.islice(chunks, self.processes * self.prefetch):
+                pending.append(self._executor.submit(_run_chunk, chunk, self.options, docs))
+            while pending:
+                results, data = pending.popleft().result()
+                chunk = next(chunks, None)
+                if chunk is not None:
+                    pending.append(self._executor.submit(_run_chunk, chunk, self.options, docs))
+                if docs:
+                    lang, doc_bytes = data
+                    for (id_, sents), doc in zip(results, DocBin().from_bytes(doc_bytes).get_docs(self._vocab(lang))):
+                        yield id_, sents, doc
+                else:
+                    yield from results
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _vocab(self, lang):
+        """The vocab the docs of the workers are rebuilt on: the preloaded model's, or a blank one of its language"""
+        if self._docs_vocab is None:
+            nlp = get_nlp(self.model, disable=self.disable) if self.preload else spacy.blank(lang)
+            self._docs_vocab = nlp.vocab
+        return self._docs_vocab
+
+    def worker_memory(self):
+        """The RSS and the unique RSS of each started worker process in bytes (see process_memory), by pid"""
+        while not self._pids.empty():
+            self._workers.add(self._pids.get())
+        return {pid: process_memory(pid) for pid in sorted(self._workers)}
+
+    def close(self):
+        """Stops the worker processes, and unfreezes the objects if it is the last open preloading pool"""
+        global _frozen
+        self._executor.shutdown(cancel_futures=True)
+        if self._frozen:
+            self._frozen = False
+            _frozen -= 1
+            if not _frozen:
+                gc.unfreeze()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
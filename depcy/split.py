@@ -27,6 +27,10 @@
     >>> print(splitIntoSubtrees(doc))
     Tom plays tennis. Jo plays socker.
 
+    Split at the top level conjunction, built from the parsed tokens without parsing again:
+    >>> print(splitSentConj(doc, reparse=False))
+    Tom plays tennis. Jo plays socker.
+
     >>> doc1 = nlp("The soldier and the teacher walk home and take supper and drink wine.")
     >>> print(splitIntoSubtrees(doc1))
     The soldier and the teacher walk home. They take supper. They drink wine.
@@ -35,26 +39,35 @@
     >>> print(splitIntoSubtrees(doc2))
     The soldier and the teacher walk to the pub. which was closed.
 
+    Without a language model, the missing subject is taken from the tree:
+    >>> doc3 = nlp("The soldier and the teacher walk home and take supper and drink wine.")
+    >>> print(splitIntoSubtrees(doc3, fill_mode="heuristic"))
+    The soldier and the teacher walk home. The soldier and the teacher take supper. The soldier and the teacher drink wine.
+
+    Many docs at once fill their <mask>s in one batched run of the fill-mask model:
+    >>> docs = nlp.pipe(["Tom plays tennis and Jo plays socker", "The soldier and the teacher walk home and take supper and drink wine."])
+    >>> for doc in splitAllIntoSubtrees(docs): print(doc)
+    Tom plays tennis. Jo plays socker.
+    The soldier and the teacher walk home. They take supper. They drink wine.
+
 """
 
+import itertools
 import logging
 from pprint import pprint
 #
 import spacy
 from spacy.tokens import Span, Doc, Token
 #
-from transformers import pipeline
-from transformers import logging as hf_logging
-#
-from depcy.base.string import toStrLeft, toStrRight, toStrSub
+from depcy.base.string import toStrLeft, toStrRight, toStrSub, descendants
+from depcy.base.index import tree_index
+from depcy.base.navigate import descendants_and_self
 from depcy.base.merge import merge_noun_conjs
+from depcy.models import resolve_nlp
+from depcy.fill_mask import FILL_MASK_MODEL, mask_filler
 
 
 logger = logging.getLogger(__name__)
-hf_logging.set_verbosity_error()
-
-nlp = spacy.load("en_core_web_sm")
-
 
 
 def split_sentences(doc):
@@ -66,80 +79,216 @@ def split_sentences(doc):
             yield doc[start:word.i + 1]
             start = word.i + 1
 
-def splitSentConj(doc,depSplit="conj"):
+def splitSentConj(doc,depSplit="conj",nlp=None,reparse=True):
     """
-    Split a sentence with a top level conjunction into two sentences.
+    Split a sentence with a top level conjunction into two sentences, parsed by nlp (default: the shared model).
+    With reparse=False the two sentences are built from the tokens of doc instead (see piecesDoc).
+    """
+    return splitAllSentConj([doc], depSplit=depSplit, nlp=nlp, reparse=reparse)[0]
+
+def splitAllSentConj(docs,depSplit="conj",nlp=None,reparse=True,batch_size=32):
+    """
+    splitSentConj for many docs: the split sentences are parsed at once with nlp.pipe, or built from the tokens
+    """
+    return splitAll(docs, conjPieces, depSplit, nlp=nlp, reparse=reparse, batch_size=batch_size)
+
+def conjPieces(doc,depSplit="conj"):
+    """
+    The two sentences of splitSentConj as (root, tokens) pieces, or None if doc has no top level depSplit
     """
     logger.debug(f"splitSentConj: {doc}")
     root = next(token for token in doc if token.dep_ == "ROOT")
     root_dict = {token.dep_: token for token in root.children}
     conj = root_dict.get(depSplit,None)
-    if conj is None: return doc
+    if conj is None: return None
     conj_dict = {token.dep_: token for token in conj.children}
 
     # the first sententce is the original sentence without the conjunction
-    textA = f"{toStrLeft(root, avoid=[depSplit])} {root.text} {toStrRight(root, avoid = [depSplit,'cc', 'punct'])}."
+    pieceA = leftOf(root, avoid=[depSplit]) + [root] + rightOf(root, avoid = [depSplit,'cc', 'punct']) + ["."]
     # the second sentence is the conjunction
     # either with its own subject
     csubj = conj_dict.get("nsubj",None)
-    if csubj is None:
-        textB = f"{root_dict.get('nsubj',None)} {toStrSub(conj, avoid=['punct'])}."
+    pieceB = subtreeOf(conj, avoid=['punct']) + ["."]
     # or relating to the subject of the first sentence
-    else:
-        textB = f"{toStrSub(conj, avoid=['punct'])}."
-    return nlp(textA.replace(" ,",",") + " " + textB)
+    if csubj is None and root_dict.get('nsubj',None) is not None:
+        pieceB = [root_dict['nsubj']] + pieceB
+    return [(root, pieceA), (conj, pieceB)]
 
 def splitUp(doc):
     """
     a simple split up a sentence into pieces
     """
-    splits = []
+    return list(iterSplitUp(doc))
+
+def iterSplitUp(doc, limit=None):
+    """
+    the pieces of splitUp, yielded one by one, at most limit (None: all)
+    """
     root = next(doc.sents).root
-    for child in root.children:
-        if len(list(child.subtree)) > 10:
-            childs = list(child.children)
-            childs.sort(key=lambda x: x.i)
-            for i, grandchild in enumerate(childs):
-                if i == 0:
-                    gchilds = list(grandchild.subtree)
-                    gchilds.append(child)
-                    gchilds.sort(key=lambda x: x.i)
-                    splits.append(gchilds)
-                else:
-                    gchilds = list(grandchild.subtree)
-                    gchilds.sort(key=lambda x: x.i)
-                    splits.append(gchilds)
-        else:
-            subt = list(child.subtree)
-            subt.sort(key=lambda x: x.i)
-            splits.append(subt)
-    return splits           
+    index = tree_index(root.doc)
+    pieces = (piece for child in root.children for piece in splitUpChild(child, index))
+    yield from itertools.islice(pieces, limit)
+
+def splitUpChild(child, index):
+    """the pieces of splitUp for a child of the root: its subtree, or those of its children when it is large"""
+    if index.tout[child.i] - index.tin[child.i] + 1 > 10:
+        for i, grandchild in enumerate(child.children):
+            if i == 0:
+                yield sorted(descendants_and_self(grandchild) + [child], key=lambda x: x.i)
+            else:
+                yield descendants_and_self(grandchild)
+    else:
+        yield descendants_and_self(child)
 
-def splitSentAtDep(doc,depSplit="ccomp"):
+def splitSentAtDep(doc,depSplit="ccomp",nlp=None,reparse=True):
     """
-    Split a sentence at a given dependency.
+    Split a sentence at a given dependency, parsed by nlp (default: the shared model).
+    With reparse=False the two sentences are built from the tokens of doc instead (see piecesDoc).
+    """
+    return splitAllSentAtDep([doc], depSplit=depSplit, nlp=nlp, reparse=reparse)[0]
+
+def splitAllSentAtDep(docs,depSplit="ccomp",nlp=None,reparse=True,batch_size=32):
+    """
+    splitSentAtDep for many docs: the split sentences are parsed at once with nlp.pipe, or built from the tokens
+    """
+    return splitAll(docs, depPieces, depSplit, nlp=nlp, reparse=reparse, batch_size=batch_size)
+
+def depPieces(doc,depSplit="ccomp"):
+    """
+    The two sentences of splitSentAtDep as (root, tokens) pieces, or None if the root has no depSplit child
     """
     logger.debug(f"splitSentAtDep: {doc}")
 
     root = next(token for token in doc if token.dep_ == "ROOT")
-    root_subj = next((token for token in root.children if token.dep_ in ["nsubj","nsubjpass"]), None)
     dep = next((token for token in root.children if token.dep_ == depSplit),None)
-    if dep is None: return doc
+    if dep is None: return None
     dep_subj = next((token for token in dep.children if token.dep_ in ["nsubj","nsubjpass"]), None)
     # the first sententce is the original sentence after carvingout the dep subtree
-    textA = f"{toStrLeft(root, avoid=[depSplit])} {root.text} {toStrRight(root, avoid = [depSplit,'cc', 'punct'])}."
+    pieceA = leftOf(root, avoid=[depSplit]) + [root] + rightOf(root, avoid = [depSplit,'cc', 'punct']) + ["."]
     # the second sentence is the dep subtree
     # either with its own subject
     if dep_subj: #TODO: check that PRON gender is equals root subject gender
-        textB = f"{toStrSub(dep, avoid=['punct'])}."
+        pieceB = subtreeOf(dep, avoid=['punct']) + ["."]
     # or taking the subject of the first sentence
     else:
-        textB = f"_ {toStrSub(dep, avoid=['punct','nsubj','nsubjpass'])}."
-    return nlp(textA + " " + textB)
+        pieceB = ["_"] + subtreeOf(dep, avoid=['punct','nsubj','nsubjpass']) + ["."]
+    return [(root, pieceA), (dep, pieceB)]
+
+def splitAll(docs, pieces, depSplit, nlp=None, reparse=True, batch_size=32):
+    """
+    Splits every doc into the sentences given by pieces(doc, depSplit); a doc without them is returned as is.
+    The sentences are parsed with nlp.pipe in one batched run (reparse=True), or built from the tokens of the doc.
+    """
+    results = []
+    texts = {}
+    for doc in docs:
+        doc_pieces = pieces(doc, depSplit)
+        if doc_pieces is None:
+            results.append(doc)
+        elif reparse:
+            texts[len(results)] = " ".join(pieceText(items) for _, items in doc_pieces)
+            results.append(None)
+        else:
+            results.append(piecesDoc(doc, doc_pieces))
+    if texts:
+        for i, parsed in zip(texts, resolve_nlp(nlp).pipe(texts.values(), batch_size=batch_size)):
+            results[i] = parsed
+    return results
 
-def splitIntoSubtrees(doc, fill_mask=True):
+# --- pieces: sentences made of the tokens of a doc and a few new ones ("." and the "_" subject)
+
+# text: (pos, tag, dep) of the new tokens, attached to the root of their piece
+NEW_TOKENS = {".": ("PUNCT", ".", "punct"), "_": ("PRON", "PRP", "nsubj")}
+
+def subtreeOf(token, avoid=[]):
+    """The token and its descendants, without those with a dependency in avoid, in sentence order"""
+    return sorted([token] + descendants(token, avoid), key=lambda t: t.i)
+
+def leftOf(token, avoid=[]):
+    """The descendants of token left of it, as toStrLeft"""
+    return [t for t in sorted(descendants(token, avoid), key=lambda t: t.i) if t.i < token.i]
+
+def rightOf(token, avoid=[]):
+    """The descendants of token right of it, as toStrRight"""
+    return [t for t in sorted(descendants(token, avoid), key=lambda t: t.i) if t.i > token.i]
+
+def pieceText(items):
+    """The text of a piece, as it is parsed again"""
+    text = " ".join(item if isinstance(item, str) else item.text for item in items[:-1]) + items[-1]
+    return text.replace(" ,",",")
+
+def piecesDoc(doc, pieces):
+    """
+    A new doc of the pieces, one sentence each, without parsing: the tokens keep text, heads, deps, POS, tag,
+    lemma, morph, entity and extension attributes; a token whose head is not in its piece (a cut edge) is
+    attached to the root of the piece, and the new tokens are attached to it too
+    """
+    words, spaces, heads, deps, pos, tags, lemmas, morphs, ents, sources = [], [], [], [], [], [], [], [], [], []
+    for n, (root, items) in enumerate(pieces):
+        offset = len(words)
+        position = {item.i: offset + k for k, item in enumerate(items) if not isinstance(item, str)}
+        for k, item in enumerate(items):
+            last = k == len(items) - 1
+            if isinstance(item, str):
+                p, tag, dep = NEW_TOKENS[item]
+                words.append(item); pos.append(p); tags.append(tag); lemmas.append(item); morphs.append("")
+                heads.append(position[root.i]); deps.append(dep); ents.append("O"); sources.append(None)
+                spaces.append(not last or n < len(pieces) - 1)
+                continue
+            words.append(item.text); pos.append(item.pos_); tags.append(item.tag_); lemmas.append(item.lemma_)
+            morphs.append(str(item.morph)); sources.append(item)
+            if item == root:
+                heads.append(position[root.i]); deps.append("ROOT")
+            else:
+                heads.append(position.get(item.head.i, position[root.i])); deps.append(item.dep_)
+            # an entity starts again where a piece starts, or where its beginning was cut away
+            iob = item.ent_iob_
+            if iob == "I" and (k == 0 or isinstance(items[k - 1], str) or items[k - 1].i != item.i - 1):
+                iob = "B"
+            ents.append(f"{iob}-{item.ent_type_}" if iob in ("B", "I") else "O")
+            spaces.append(bool(item.whitespace_) and not last and not isinstance(items[k + 1], str))
+    new_doc = Doc(doc.vocab, words=words, spaces=spaces, heads=heads, deps=deps, pos=pos, tags=tags,
+                  lemmas=lemmas, morphs=morphs, ents=ents)
+    # extension attributes are kept in user_data by character offset
+    extensions = {}
+    for key, value in doc.user_data.items():
+        if isinstance(key, tuple) and len(key) == 4 and key[0] == "._." and key[3] is None:
+            extensions.setdefault(key[2], []).append((key[1], value))
+    for token, source in zip(new_doc, sources):
+        if source is not None:
+            for name, value in extensions.get(source.idx, []):
+                new_doc.user_data[("._.", name, token.idx, None)] = value
+    return new_doc
+
+def splitIntoSubtrees(doc, fill_mask=True, nlp=None, cache=None, model=FILL_MASK_MODEL, fill_mode="model"):
     """ 
         Split a sentence into subtrees headed by a verb. if noFill is False, the <mask> is used instead of the subject.
+        The result is parsed by nlp (default: the shared model). Masks are filled by model (see fillMasks),
+        and looked up in and stored to cache (a depcy.cache.MaskCache), if given.
+        With fill_mode "heuristic" the missing subject is taken from the tree instead (see inheritedSubject),
+        with "heuristic+model" the model fills only the masks the heuristic could not resolve.
+    """
+    return splitAllIntoSubtrees([doc], fill_mask=fill_mask, nlp=nlp, cache=cache, model=model, fill_mode=fill_mode)[0]
+
+def splitAllIntoSubtrees(docs, fill_mask=True, nlp=None, batch_size=32, cache=None, model=FILL_MASK_MODEL, fill_mode="model"):
+    """
+        Split many sentences into subtrees headed by a verb, see splitIntoSubtrees.
+        The <mask>s of all docs are filled in one batched run of the fill-mask model,
+        and the results are parsed with nlp.pipe.
+    """
+    if fill_mode not in FILL_MODES:
+        raise ValueError(f"fill_mode must be one of {FILL_MODES}, not {fill_mode!r}")
+    nlp = resolve_nlp(nlp)
+    heuristic = fill_mask and fill_mode.startswith("heuristic")
+    phrases = [subtreePhrases(doc, heuristic=heuristic) for doc in docs]
+    if fill_mask and fill_mode.endswith("model"):
+        phrases = fillAllPhrases(phrases, model=model, batch_size=batch_size, cache=cache)
+    return list(nlp.pipe([" ".join(results) for results in phrases], batch_size=batch_size))
+
+def subtreePhrases(doc, heuristic=False):
+    """
+        Returns one phrase per subtree headed by a verb, with <mask> for a missing subject.
+        If heuristic is True, the missing subject is taken from the tree where possible.
     """
     doc = merge_noun_conjs(doc) # get conjuncted noun phrases out of the way
     verbs = [token for token in doc if token.pos_ in ["VERB","AUX"] and len(list(token.children)) > 0]
@@ -155,7 +304,8 @@ def splitIntoSubtrees(doc, fill_mask=True):
 
         # Determine if we need to use the placeholder
         if subj is None and subject_printed:
-            subject_prefix = "<mask>"
+            inherited = inheritedSubject(verb) if heuristic else None
+            subject_prefix = subjectStr(inherited) if inherited is not None else "<mask>"
         else:
             subject_prefix = toStrLeft(verb, avoid=['conj', 'relcl'])
             if subj is not None:
@@ -164,32 +314,70 @@ def splitIntoSubtrees(doc, fill_mask=True):
         right_str = toStrRight(verb, avoid=['conj','relcl', 'cc', 'punct'])
         result = f"{subject_prefix} {verb.text} {right_str}."
         results.append(result)
-      
-    if not fill_mask:
-        return nlp(" ".join(results))
-    else:
-        filled = fillPhrases(results)
-        return nlp(" ".join(filled))
-    
-def fillPhrase(context, phrase):
-    # Use hugging face llm pipeline to fill the <mask> in the phrase
-    # To provide context, we prepend the context with 'and' to the phrase
-    classifier = pipeline("fill-mask",model="distilroberta-base",)
-    results = classifier(f"{context} and {phrase}")
-    if results is not None:
-        phrase = results[0]['sequence'].replace(context,"").replace(" and ", "") #type: ignore
-    return phrase[0].upper() + phrase[1:]
-
-def fillPhrases(phrases):
-    results = []
-    for phrase in phrases:
-        if '<mask>' in phrase:
-            newPharse = fillPhrase(phrases[0],phrase)
-        else:
-            newPharse = phrase
-        results.append(newPharse)
     return results
 
+# --- fill a missing subject from the tree
+
+FILL_MODES = ("model", "heuristic", "heuristic+model")
+SUBJ_DEPS = ["nsubj", "nsubjpass"]
+
+def inheritedSubject(verb):
+    """
+    Returns the subject of the nearest head verb that has one, else the nearest subject
+    preceding verb (skipping relative pronouns), or None.
+    """
+    token = verb
+    while token.head != token:
+        token = token.head
+        if token.pos_ in ["VERB","AUX"]:
+            subj = next((child for child in token.children if child.dep_ in SUBJ_DEPS), None)
+            if subj is not None: return subj
+    return next((token for token in reversed(verb.doc[:verb.i])
+                 if token.dep_ in SUBJ_DEPS and token.tag_ not in ["WDT","WP"]), None)
+
+def subjectStr(subj):
+    """Returns the subject phrase of subj, without its clauses, capitalized to start a sentence"""
+    avoid = ['relcl', 'acl', 'appos', 'punct']
+    text = " ".join(s for s in [toStrLeft(subj, avoid=avoid), subj.text, toStrRight(subj, avoid=avoid)] if s)
+    return text[0].upper() + text[1:]
+
+# --- fill <mask> with a fill-mask model, see depcy.fill_mask for the backends
+
+def fillMasks(pairs, model=FILL_MASK_MODEL, batch_size=32, cache=None):
+    """
+    Fill the <mask> of many (context, phrase) pairs in one batched run of the fill-mask model.
+    To provide context, we prepend the context with 'and' to the phrase.
+    The model is a name or path for the hugging face pipeline, or a depcy.fill_mask.MaskFiller.
+    Prompts found in cache skip the model, new ones are stored there.
+    """
+    prompts = [f"{context} and {phrase}" for context, phrase in pairs]
+    key = model if isinstance(model, str) else (model.name or type(model).__name__)
+    sequences = cache.get_many(key, prompts) if cache is not None else {}
+    missing = list(dict.fromkeys(prompt for prompt in prompts if prompt not in sequences))
+    if missing:
+        new = dict(zip(missing, mask_filler(model)(missing, batch_size=batch_size)))
+        if cache is not None: cache.put_many(key, new)
+        sequences.update(new)
+    filled = []
+    for (context, _), prompt in zip(pairs, prompts):
+        phrase = sequences[prompt].replace(context,"").replace(" and ", "")
+        filled.append(phrase[0].upper() + phrase[1:])
+    return filled
+
+def fillPhrase(context, phrase, model=FILL_MASK_MODEL, cache=None):
+    # Use hugging face llm pipeline to fill the <mask> in the phrase
+    return fillMasks([(context, phrase)], model=model, cache=cache)[0]
+
+def fillPhrases(phrases, model=FILL_MASK_MODEL, batch_size=32, cache=None):
+    """Fill all <mask>s in phrases in one batch, using the first phrase as context"""
+    return fillAllPhrases([phrases], model=model, batch_size=batch_size, cache=cache)[0]
+
+def fillAllPhrases(list_of_phrases, model=FILL_MASK_MODEL, batch_size=32, cache=None):
+    """Fill all <mask>s in many lists of phrases in one batch, each list using its first phrase as context"""
+    pairs = [(phrases[0], phrase) for phrases in list_of_phrases for phrase in phrases if '<mask>' in phrase]
+    filled = iter(fillMasks(pairs, model=model, batch_size=batch_size, cache=cache))
+    return [[next(filled) if '<mask>' in phrase else phrase for phrase in phrases] for phrases in list_of_phrases]
+
 if __name__ == "__main__":
     import doctest
     doctest.testmod()
\ No newline at end of file
@@ -28,7 +28,6 @@
 """
 
 import logging
-from transformers import logging as hf_logging
 from pprint import pprint
 #
 import spacy
@@ -37,8 +36,6 @@ from spacy.tokens import Span, Doc, Token
 from depcy.base.string import toStr
 
 logger = logging.getLogger(__name__)
-hf_logging.set_verbosity_error()
-nlp = spacy.load("en_core_web_sm")
 
 # --- extensions
 # You have to set both, Span and Token: TODO: why?
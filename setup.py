@@ -3,10 +3,24 @@ from setuptools import setup, find_packages
 setup(
     name='depcy',
     version='0.1.0',
-    packages=find_packages(),
+    packages=find_packages(exclude=["benchmarks"]),
     install_requires=[
         'spacy',
-        'transformers',
-        'torch'
     ],
+    extras_require={
+        # only needed by split.fillPhrase(s), i.e. splitIntoSubtrees(doc, fill_mask=True)
+        'fill-mask': [
+            'transformers',
+            'torch'
+        ],
+        # only needed by depcy.fill_mask.OnnxMaskFiller
+        'onnx': [
+            'transformers',
+            'onnxruntime'
+        ],
+        # only needed by depcy.export.ParquetExporter
+        'arrow': [
+            'pyarrow'
+        ],
+    },
 )
\ No newline at end of file